@@ -0,0 +1,200 @@
+import math
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from rewards import reward_bands
+
+# Joint changes per discrete action, as in robotEnv.CustomEnv.step
+ANGLE1_CHANGE = np.array([-5, 5, 0, 0, 0], dtype=np.float64)
+ANGLE2_CHANGE = np.array([0, 0, 5, -5, 0], dtype=np.float64)
+
+
+class BatchRobotEnv(VecEnv):
+    """N robot arms held as NumPy arrays and stepped in one call.
+
+    Follows robotEnv.CustomEnv(obs_mode="vector") step for step: same kinematics, reward
+    bands, pick/place transitions, game over and simulated-time timer penalties. Finished
+    arms are reset automatically as SB3 VecEnvs do; wrap in VecMonitor for episode stats.
+    """
+
+    def __init__(self, num_envs, seed=None):
+        # Constants, as in robotEnv.CustomEnv
+        self.WIDTH, self.HEIGHT = 800, 600
+        self.FPS = 60
+        self.TIMER_LIMIT = 15  # Timer limit in simulated seconds
+        self.DIAGONAL = math.hypot(self.WIDTH, self.HEIGHT)
+        self.object_radius = 20
+        self.base_x, self.base_y = self.WIDTH // 2, self.HEIGHT // 2
+        self.arm_length = 100
+        self.render_mode = None
+
+        observation_space = spaces.Box(low=-1.0, high=1.0, shape=(14,), dtype=np.float32)
+        action_space = spaces.Discrete(5)
+        super().__init__(num_envs, observation_space, action_space)
+
+        # Struct of arrays, one row per arm
+        self.angle1 = np.zeros(num_envs)
+        self.angle2 = np.zeros(num_envs)
+        self.holding = np.zeros(num_envs, dtype=bool)
+        self.apple_pos = np.zeros((num_envs, 2))
+        self.box_pos = np.zeros((num_envs, 2))
+        self.state = np.zeros((num_envs, 2), dtype=np.int8)  # [picked, placed]
+        self.score = np.zeros(num_envs)
+        self.running = np.ones(num_envs, dtype=bool)
+        self.TIMER_STATE = np.zeros(num_envs, dtype=np.int64)
+        self.timer_start = np.full(num_envs, -1, dtype=np.int64)  # Clock step, -1 while the timer is stopped
+        self.steps = np.zeros(num_envs, dtype=np.int64)  # Simulated clock ticks since reset
+
+        self.rng = np.random.default_rng(seed)
+        self.actions = np.zeros(num_envs, dtype=np.int64)
+
+    def generate_apple_position(self, count):
+        min_x = max(self.base_x - self.arm_length, 0)
+        max_x = min(self.base_x + self.arm_length, self.WIDTH)
+        min_y = max(self.base_y - self.arm_length, 0)
+        max_y = min(self.base_y + self.arm_length, self.HEIGHT)
+        x = self.rng.integers(min_x, max_x + 1, size=count)
+        y = self.rng.integers(min_y, max_y + 1, size=count)
+        return np.stack([x, y], axis=1)
+
+    def end_effector(self):
+        end_x2 = self.base_x + self.arm_length * (np.cos(np.radians(self.angle1)) + np.cos(np.radians(self.angle2)))
+        end_y2 = self.base_y - self.arm_length * (np.sin(np.radians(self.angle1)) + np.sin(np.radians(self.angle2)))
+        return end_x2, end_y2
+
+    def _reset_arms(self, mask):
+        self.angle1[mask] = 0
+        self.angle2[mask] = 0
+        self.holding[mask] = False
+        self.apple_pos[mask] = (250, 300)
+        self.box_pos[mask] = (3 * self.WIDTH // 4, self.HEIGHT // 2)
+        self.state[mask] = 0
+        self.score[mask] = 0
+        self.running[mask] = True
+        self.TIMER_STATE[mask] = 0
+        self.timer_start[mask] = -1
+        self.steps[mask] = 0
+
+    def _get_observation(self):
+        rad1, rad2 = np.radians(self.angle1), np.radians(self.angle2)
+        sin1, cos1, sin2, cos2 = np.sin(rad1), np.cos(rad1), np.sin(rad2), np.cos(rad2)
+        end_x2 = self.base_x + self.arm_length * (cos1 + cos2)
+        end_y2 = self.base_y - self.arm_length * (sin1 + sin2)
+        distance_to_apple = np.hypot(self.apple_pos[:, 0] - end_x2, self.apple_pos[:, 1] - end_y2)
+        distance_to_box = np.hypot(self.box_pos[:, 0] - end_x2, self.box_pos[:, 1] - end_y2)
+
+        # Same layout and scaling as robotEnv.CustomEnv._get_vector_observation
+        return np.stack([
+            sin1, cos1, sin2, cos2,
+            end_x2 / self.WIDTH, end_y2 / self.HEIGHT,
+            self.apple_pos[:, 0] / self.WIDTH, self.apple_pos[:, 1] / self.HEIGHT,
+            self.box_pos[:, 0] / self.WIDTH, self.box_pos[:, 1] / self.HEIGHT,
+            distance_to_apple / self.DIAGONAL, distance_to_box / self.DIAGONAL,
+            self.state[:, 0], self.state[:, 1],
+        ], axis=1).astype(np.float32)
+
+    def reset(self):
+        # One generator drives the whole batch, reseeded from the first per-env seed
+        if self._seeds[0] is not None:
+            self.rng = np.random.default_rng(self._seeds[0])
+        self._reset_seeds()
+        self._reset_options()
+        self._reset_arms(slice(None))
+        return self._get_observation()
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        angle1_change = ANGLE1_CHANGE[self.actions]
+        angle2_change = ANGLE2_CHANGE[self.actions]
+
+        # Distances from the pose before the action
+        end_x2, end_y2 = self.end_effector()
+        distance_to_apple = np.hypot(self.apple_pos[:, 0] - end_x2, self.apple_pos[:, 1] - end_y2)
+        distance_to_box = np.hypot(self.box_pos[:, 0] - end_x2, self.box_pos[:, 1] - end_y2)
+
+        self.angle1 += angle1_change
+        self.angle2 += angle2_change
+
+        # Pick / place test the pose after the first update, like RobotArm.pick / place
+        state_00 = (self.state[:, 0] == 0) & (self.state[:, 1] == 0)
+        state_10 = (self.state[:, 0] == 1) & (self.state[:, 1] == 0)
+        near_apple = distance_to_apple < self.object_radius
+        near_box = ~near_apple & (distance_to_box < self.object_radius)
+        end_x2, end_y2 = self.end_effector()
+        picked = near_apple & state_00 & \
+            (np.hypot(self.apple_pos[:, 0] - end_x2, self.apple_pos[:, 1] - end_y2) < self.object_radius)
+        placed = near_box & state_10 & self.holding & \
+            (np.hypot(self.box_pos[:, 0] - end_x2, self.box_pos[:, 1] - end_y2) < self.object_radius)
+
+        self.score = reward_bands(self.object_radius)(self.score, distance_to_apple, distance_to_box, self.state,
+                                                      picked, placed)
+
+        self.state[picked] = (1, 0)
+        self.holding[picked] = True
+        self.state[placed] = (1, 1)
+        self.holding[placed] = False
+        moved = picked | placed
+        if moved.any():
+            self.apple_pos[moved] = self.generate_apple_position(int(moved.sum()))
+
+        # The second update from CustomEnv.step
+        self.angle1 += angle1_change
+        self.angle2 += angle2_change
+
+        # Game over
+        game_over = (self.score >= 10_000) | (self.score <= -1000) | (self.TIMER_STATE >= 4) | \
+            ((self.state[:, 0] == 1) & (self.state[:, 1] == 1))
+        self.running &= ~game_over
+
+        # Timer penalties on simulated seconds
+        expired = (self.timer_start >= 0) & ((self.steps - self.timer_start) / self.FPS >= self.TIMER_LIMIT)
+        if expired.any():
+            self.score[expired] -= 500
+            self.timer_start[expired] = -1
+            self.TIMER_STATE[expired] += 1
+            timed_out = expired & (self.TIMER_STATE > 4)
+            self.score[timed_out] -= 2000
+            self.state[timed_out] = 0
+            self.holding[timed_out] = False
+            self.TIMER_STATE[timed_out] = 0
+
+        # Clock tick and timer start
+        self.steps += 1
+        self.timer_start = np.where(self.timer_start < 0, self.steps, self.timer_start)
+
+        rewards = self.score.astype(np.float32)
+        dones = ~self.running
+        observation = self._get_observation()
+        infos = [{} for _ in range(self.num_envs)]
+        if dones.any():
+            for env_idx in np.flatnonzero(dones):
+                infos[env_idx]["terminal_observation"] = observation[env_idx].copy()
+                infos[env_idx]["TimeLimit.truncated"] = False
+            self._reset_arms(dones)
+            observation[dones] = self._get_observation()[dones]
+        return observation, rewards, dones, infos
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        value = getattr(self, attr_name)
+        if isinstance(value, np.ndarray) and value.shape[:1] == (self.num_envs,):
+            return [value[env_idx] for env_idx in self._get_indices(indices)]
+        return [value for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        current = getattr(self, attr_name, None)
+        if isinstance(current, np.ndarray) and current.shape[:1] == (self.num_envs,):
+            current[list(self._get_indices(indices))] = value
+        else:
+            setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
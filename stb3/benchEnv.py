@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # Headless, nothing here opens a window
+
+import numpy as np
+import pygame
+import customENV
+import robotEnv
+from batchEnv import BatchRobotEnv
+
+
+# Benchmarked envs: name -> (factory, vectorized). Vectorized envs step every arm per call and
+# are counted in arm steps
+CASES = {
+    "robotEnv-pixels": (lambda: robotEnv.CustomEnv(render_mode="rgb_array"), False),
+    "robotEnv-pixels-84-gray": (lambda: robotEnv.CustomEnv(render_mode="rgb_array", obs_size=(84, 84),
+                                                           grayscale=True, hud=False), False),
+    "robotEnv-vector": (lambda: robotEnv.CustomEnv(render_mode="rgb_array", obs_mode="vector", hud=False), False),
+    "robotEnv-vector-table": (lambda: robotEnv.CustomEnv(render_mode="rgb_array", obs_mode="vector", hud=False,
+                                                         reward_table=True), False),
+    "robotEnv-compact": (lambda: robotEnv.CustomEnv(render_mode="rgb_array", obs_mode="compact", hud=False), False),
+    "robotEnv-vector-timed": (lambda: robotEnv.CustomEnv(render_mode="rgb_array", obs_mode="vector", hud=False,
+                                                         step_timing=True), False),
+    "customENV-pixels": (lambda: customENV.CustomEnv(render_mode="rgb_array"), False),
+    "batchEnv-64": (lambda: BatchRobotEnv(64), True),
+}
+
+
+def action_trace(env, vectorized, steps, seed):
+    # The same actions on every run, the trace only depends on the seed and the env's action space
+    rng = np.random.default_rng(seed)
+    if vectorized:
+        return rng.integers(0, env.action_space.n, size=(steps, env.num_envs))
+    return rng.integers(0, env.action_space.n, size=steps)
+
+
+def reset(env, vectorized, seed=None):
+    if vectorized:
+        if seed is not None:
+            env.seed(seed)
+        return env.reset()
+    return env.reset(seed=seed)[0]
+
+
+def step(env, vectorized, action):
+    # Observation and whether the env needs a reset
+    if vectorized:
+        env.step_async(action)
+        return env.step_wait()[0], False  # Finished arms reset themselves
+    observation, _, terminated, truncated, _ = env.step(action)
+    return observation, terminated or truncated
+
+
+def run_steps(env, vectorized, actions):
+    # Seconds spent in step(), resets are left out
+    elapsed = 0.0
+    for action in actions:
+        start = time.perf_counter()
+        _, done = step(env, vectorized, action)
+        elapsed += time.perf_counter() - start
+        if done:
+            reset(env, vectorized)
+    return elapsed
+
+
+def bench_case(name, steps, resets, repeat, alloc_steps, seed):
+    factory, vectorized = CASES[name]
+    env = factory()
+    arms = env.num_envs if vectorized else 1
+    actions = action_trace(env, vectorized, steps, seed)
+
+    # Throughput: best of repeat runs over the same trace from the same seed, after a warm-up
+    observation = reset(env, vectorized, seed)
+    run_steps(env, vectorized, actions[:min(100, steps)])
+    times = []
+    for _ in range(repeat):
+        reset(env, vectorized, seed)
+        times.append(run_steps(env, vectorized, actions))
+    best = min(times)
+
+    # Reset latency
+    reset_times = []
+    for i in range(resets):
+        start = time.perf_counter()
+        reset(env, vectorized, seed + i)
+        reset_times.append(time.perf_counter() - start)
+
+    # Allocation: the peak traced memory above what was live before each step, which counts the
+    # temporaries a step creates and frees as well as what it keeps
+    reset(env, vectorized, seed)
+    tracemalloc.start()
+    allocated = 0
+    for action in actions[:alloc_steps]:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        _, done = step(env, vectorized, action)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+        if done:
+            reset(env, vectorized)
+    tracemalloc.stop()
+    env.close()
+
+    return {
+        "arms": arms,
+        "steps": steps,
+        "steps_per_sec": steps * arms / best,
+        "step_us": best / (steps * arms) * 1e6,
+        "step_us_runs": [elapsed / (steps * arms) * 1e6 for elapsed in times],
+        "reset_ms": float(np.median(reset_times)) * 1e3,
+        "alloc_bytes_per_step": allocated / (min(alloc_steps, steps) * arms),
+        "obs_bytes": int(np.asarray(observation).nbytes) // arms,
+    }
+
+
+def bench(names, steps, resets, repeat, alloc_steps, seed):
+    results = {}
+    for name in names:
+        results[name] = bench_case(name, steps, resets, repeat, alloc_steps, seed)
+        result = results[name]
+        print(f"{name:26s} {result['steps_per_sec']:12.0f} steps/s  reset {result['reset_ms']:7.3f} ms  "
+              f"alloc {result['alloc_bytes_per_step']:9.0f} B/step  obs {result['obs_bytes']:7d} B")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pygame": pygame.version.ver,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "steps": steps,
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    # Names of the cases whose throughput fell more than threshold below the baseline
+    regressions = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]["steps_per_sec"]
+        change = result["steps_per_sec"] / old - 1
+        regressed = change < -threshold
+        print(f"{name:26s} {old:12.0f} -> {result['steps_per_sec']:12.0f} steps/s  {change:+7.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark env step and reset speed, allocation and observation size.")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES), help="Envs to benchmark")
+    parser.add_argument("--steps", type=int, default=2000, help="Steps of the action trace, per arm for batched envs")
+    parser.add_argument("--resets", type=int, default=50, help="Resets timed for the reset latency")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs over the trace, the fastest one counts")
+    parser.add_argument("--alloc-steps", type=int, default=200, help="Steps traced with tracemalloc")
+    parser.add_argument("--seed", type=int, default=0, help="Seeds the envs and the action trace")
+    parser.add_argument("--output", default="report/benchEnv.json", help="Where the JSON results are written")
+    parser.add_argument("--compare", default=None, metavar="BASELINE",
+                        help="Results JSON to compare against, exits with 1 on a throughput regression")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="With --compare, largest accepted drop in steps/s as a fraction of the baseline")
+    args = parser.parse_args()
+
+    # Read the baseline first, --output may well be the same file
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = bench(args.cases, args.steps, args.resets, args.repeat, args.alloc_steps, args.seed)
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Throughput regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,174 @@
+import json
+import os
+import time
+from matplotlib.image import imsave
+import torch
+from stable_baselines3.common import callbacks
+from stable_baselines3.common.callbacks import BaseCallback
+import tracing
+
+
+class TraceCallback(BaseCallback):
+    """Records the phases of an on-policy learn() as tracing spans: rollout for each
+    rollout collection and train for the gradient updates that follow it."""
+
+    def __init__(self, verbose=0):
+        super().__init__(verbose)
+        self._phase = None
+        self._start = 0
+
+    def _switch(self, phase):
+        # Closes the running phase's span and starts the next one
+        tracer = tracing.tracer()
+        now = time.perf_counter_ns()
+        if tracer is not None and self._phase is not None:
+            tracer.complete(self._phase, "learner", self._start, now, {"timesteps": self.num_timesteps})
+        self._phase, self._start = phase, now
+
+    def _on_rollout_start(self):
+        self._switch("rollout")
+
+    def _on_rollout_end(self):
+        self._switch("train")
+
+    def _on_step(self):
+        return True
+
+    def _on_training_end(self):
+        self._switch(None)
+
+
+class ProfilerCallback(BaseCallback):
+    """Times rollout collection against the gradient updates of an on-policy learn().
+
+    Each update appends a JSON line to <log_dir>/profile.jsonl with the rollout and update
+    wall times and samples/sec, and the same numbers go to the SB3 logger (tensorboard)
+    under profile/. Updates numbered in torch_updates (from 0) are captured with
+    torch.profiler into a Chrome trace and an op table. At training end the totals are
+    written to <log_dir>/profile_summary.json.
+    """
+
+    def __init__(self, log_dir, torch_updates=(), verbose=0):
+        super().__init__(verbose)
+        self.log_dir = log_dir
+        self.torch_updates = set(torch_updates)
+        self.update = 0
+        self.totals = {"rollout_s": 0.0, "update_s": 0.0, "samples": 0, "updates": 0}
+        self._file = None
+        self._profiler = None
+        self._rollout_start = None
+        self._rollout_end = None
+        self._rollout_s = 0.0
+        self._samples = 0
+        self._start_timesteps = 0
+
+    def _on_training_start(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._file = open(os.path.join(self.log_dir, "profile.jsonl"), "a")
+
+    def _on_rollout_start(self):
+        now = time.perf_counter()
+        self._finish_update(now)
+        self._rollout_start = now
+        self._start_timesteps = self.num_timesteps
+
+    def _on_rollout_end(self):
+        self._rollout_end = time.perf_counter()
+        self._rollout_s = self._rollout_end - self._rollout_start
+        self._samples = self.num_timesteps - self._start_timesteps
+        if self.update in self.torch_updates:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._profiler = torch.profiler.profile(activities=activities)
+            self._profiler.__enter__()
+
+    def _on_step(self):
+        return True
+
+    def _finish_update(self, now):
+        # Closes the update that ran since the last rollout ended
+        if self._rollout_end is None:
+            return
+        update_s = now - self._rollout_end
+        self._rollout_end = None
+        if self._profiler is not None:
+            self._profiler.__exit__(None, None, None)
+            prefix = os.path.join(self.log_dir, f"torch_update_{self.update}")
+            self._profiler.export_chrome_trace(prefix + ".json")
+            with open(prefix + ".txt", "w") as f:
+                f.write(self._profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=30))
+            self._profiler = None
+
+        row = {
+            "update": self.update,
+            "timesteps": self.num_timesteps,
+            "samples": self._samples,
+            "rollout_s": self._rollout_s,
+            "update_s": update_s,
+            "rollout_samples_per_s": self._samples / self._rollout_s if self._rollout_s else None,
+            "update_samples_per_s": self._samples / update_s if update_s else None,
+            "samples_per_s": self._samples / (self._rollout_s + update_s),
+        }
+        self._file.write(json.dumps(row) + "\n")
+        self._file.flush()
+        for name in ("rollout_s", "update_s", "rollout_samples_per_s", "update_samples_per_s", "samples_per_s"):
+            if row[name] is not None:
+                self.logger.record(f"profile/{name}", row[name])
+
+        self.totals["rollout_s"] += self._rollout_s
+        self.totals["update_s"] += update_s
+        self.totals["samples"] += self._samples
+        self.totals["updates"] += 1
+        self.update += 1
+
+    def summary(self):
+        totals = dict(self.totals)
+        elapsed = totals["rollout_s"] + totals["update_s"]
+        totals["rollout_share"] = totals["rollout_s"] / elapsed if elapsed else None
+        totals["samples_per_s"] = totals["samples"] / elapsed if elapsed else None
+        return totals
+
+    def _on_training_end(self):
+        self._finish_update(time.perf_counter())
+        self._file.close()
+        summary = self.summary()
+        with open(os.path.join(self.log_dir, "profile_summary.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        if self.verbose:
+            print(f"Rollouts {summary['rollout_s']:.1f}s, updates {summary['update_s']:.1f}s "
+                  f"({summary['rollout_share'] or 0:.0%} collecting), {summary['samples_per_s'] or 0:.0f} samples/s")
+
+
+class CheckpointCallback(callbacks.CheckpointCallback):
+    """SB3's CheckpointCallback with each save recorded as a model.save tracing span."""
+
+    def _on_step(self):
+        if self.n_calls % self.save_freq != 0:
+            return True
+        with tracing.span("model.save", "learner"):
+            return super()._on_step()
+
+
+class RenderSnapshotCallback(BaseCallback):
+    """Saves a PNG of the training envs' render() every save_freq calls to the envs'
+    step, as <save_path>/<num_timesteps>.png. Needs envs made with render_mode="rgb_array"."""
+
+    def __init__(self, save_freq, save_path, verbose=0):
+        super().__init__(verbose)
+        self.save_freq = save_freq
+        self.save_path = save_path
+
+    def _init_callback(self):
+        os.makedirs(self.save_path, exist_ok=True)
+
+    def _on_step(self):
+        if self.n_calls % self.save_freq == 0:
+            with tracing.span("render.snapshot", "learner"):
+                frame = self.training_env.render()
+                if frame is not None:
+                    path = os.path.join(self.save_path, f"{self.num_timesteps}.png")
+                    imsave(path, frame)
+                    if self.verbose:
+                        print(f"Saved render snapshot to {path}")
+        return True
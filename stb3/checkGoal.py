@@ -0,0 +1,30 @@
+import numpy as np
+from robotEnv import CustomEnv
+from goalEnv import GoalRobotEnv, GOAL_INFO
+
+# Checks goalEnv.compute_reward and compute_done against the rewards and dones of the env itself,
+# which is what HerReplayBuffer relies on when it relabels transitions.
+
+
+def check_goal(steps=200_000, seed=0):
+    env = GoalRobotEnv(CustomEnv(render_mode="rgb_array", obs_mode="vector", hud=False))
+    observation, _ = env.reset(seed=seed)
+    actions = np.random.default_rng(seed).integers(0, 4, steps)
+    episodes = places = 0
+    for action in actions:
+        next_observation, reward, done, _, info = env.step(action)
+        goal_info = {name: np.asarray(info[name]) for name in GOAL_INFO}
+        expected = env.compute_reward(info["achieved_goal"], observation["desired_goal"], goal_info)
+        expected_done = env.compute_done(info["achieved_goal"], observation["desired_goal"], goal_info)
+        assert expected == reward and expected_done == done, (reward, expected, done, expected_done)
+        places += reward >= 10_000
+        observation = next_observation
+        if done:
+            episodes += 1
+            observation, _ = env.reset()
+    print(f"compute_reward and compute_done match the env over {steps} steps, {episodes} episodes, "
+          f"{places} places")
+
+
+if __name__ == "__main__":
+    check_goal()
@@ -0,0 +1,57 @@
+import numpy as np
+from replayBuffer import SumTree, PrioritizedReplayBuffer
+
+# Checks the SumTree behind PrioritizedReplayBuffer: sums after updates, prefix-sum lookups and
+# sampling in proportion to priority ** alpha.
+
+
+def check_tree(capacity=1000, updates=200, seed=0):
+    # Every node is the sum of its children after batched updates, repeated indices included
+    rng = np.random.default_rng(seed)
+    tree = SumTree(capacity)
+    priorities = np.zeros(capacity)
+    for _ in range(updates):
+        indices = rng.integers(0, capacity, rng.integers(1, 64))
+        values = rng.uniform(0, 10, len(indices))
+        tree.update(indices, values)
+        priorities[indices] = values  # The last write to an index wins, as in the tree
+        assert np.array_equal(tree.get(np.arange(capacity)), priorities)
+        assert np.isclose(tree.total, priorities.sum())
+    nodes = np.arange(1, tree.leaf_start)
+    assert np.allclose(tree.tree[nodes], tree.tree[2 * nodes] + tree.tree[2 * nodes + 1])
+
+    # find lands on the leaf whose prefix-sum interval holds the value
+    bounds = np.cumsum(priorities)
+    values = rng.uniform(0, tree.total, 10_000)
+    assert np.array_equal(tree.find(values), np.searchsorted(bounds, values, side="right"))
+    print(f"SumTree sums and lookups match over {updates} batched updates")
+
+
+def check_sampling(capacity=64, alpha=0.6, draws=400_000, seed=0):
+    # Sampled frequencies follow priority ** alpha, before and after update_priorities
+    np.random.seed(seed)
+    buffer = PrioritizedReplayBuffer(capacity, alpha)
+    for _ in range(capacity):
+        buffer.push(np.zeros(2, dtype=np.float32), 0, 0.0, np.zeros(2, dtype=np.float32), False)
+
+    for td_errors in (None, np.random.uniform(0, 5, capacity)):
+        if td_errors is None:
+            expected = np.full(capacity, 1.0 / capacity)
+        else:
+            buffer.update_priorities(np.arange(capacity), td_errors)
+            expected = (np.abs(td_errors) + buffer.epsilon) ** alpha
+            expected /= expected.sum()
+        counts = np.zeros(capacity)
+        for _ in range(draws // 256):
+            indices, weights = buffer.sample_indices(256)
+            counts += np.bincount(indices, minlength=capacity)
+            assert weights.max() == 1.0
+        frequencies = counts / counts.sum()
+        error = np.abs(frequencies - expected).max()
+        assert error < 0.002, (error, frequencies, expected)
+    print(f"Prioritized sampling follows priority ** alpha over {draws} draws")
+
+
+if __name__ == "__main__":
+    check_tree()
+    check_sampling()
@@ -0,0 +1,215 @@
+import math
+import numpy as np
+from robotEnv import CustomEnv
+from batchEnv import BatchRobotEnv
+from rewards import reward_bands
+
+# Checks rewards.REWARD_BANDS against the if/elif chain robotEnv.CustomEnv.step used before the
+# table, kept here as the reference implementation.
+
+
+class ReferenceEnv(CustomEnv):
+    def band_reward(self, angle1_change, angle2_change):
+        # Calculate distance to apple and store it as an attribute
+        end_x2, end_y2 = self.robot_arm.end_effector()
+
+        self.distance_to_apple = math.hypot(self.apple_pos[0] - end_x2, self.apple_pos[1] - end_y2)
+
+        self.distance_to_box = math.hypot(self.box_pos[0] - end_x2, self.box_pos[1] - end_y2)
+
+        # Check if gripper passes over the target (apple)
+        # Update robot arm angles based on action
+        self.update(angle1_change, angle2_change)
+        
+        # Reward logic
+        if self.distance_to_apple < self.object_radius:  # Gripper passes over the apple
+            if self.state == [0,0]:
+                if self.robot_arm.pick(self.apple_pos, self.object_radius):
+                    self.score += 1000  # Reward for passing over the target
+                    self.state[0] = 1  # Indicating the apple has been picked
+                    self.state[1] = 0  # Indicating the apple has been placed
+                    self.apple_pos = self.generate_apple_position()  # Generate a new apple position
+                # self.timer_start = None  # Reset timer
+            else:
+                self.score = -300
+
+        elif self.distance_to_box < self.object_radius:
+            if self.state == [1,0]:
+                if self.robot_arm.place(self.box_pos, self.object_radius):
+                    self.score = 100_000
+                    # self.state == [1,1]
+                    self.state[0] = 1  # Indicating the apple has been picked
+                    self.state[1] = 1  # Indicating the apple has been placed
+                    self.apple_pos = self.generate_apple_position()
+            # if self.state == [0,0]:
+            #     self.score = -20
+            else:
+                self.score = -300
+
+        # Robot state [0, 0]
+        elif self.distance_to_apple <= 5 and self.state == [0, 0]:
+            self.score = 30
+        elif (self.distance_to_apple > 5 and self.distance_to_apple <= 10) and self.state == [0, 0]:
+            self.score = 20
+        elif (self.distance_to_apple > 10 and self.distance_to_apple <= 15) and self.state == [0, 0]:
+            self.score = 10
+
+        
+        elif self.distance_to_box <= 0 and self.state == [0, 0]:
+            self.score = -500
+        elif (self.distance_to_box > 5 and self.distance_to_box <= 10) and self.state == [0, 0]:
+            self.score = -400
+        elif (self.distance_to_box > 10 and self.distance_to_box <= 15) and self.state == [0, 0]:
+            self.score = -300
+        elif (self.distance_to_box < self.object_radius) and self.state == [0, 0]:
+            self.score = -700
+
+        # Robot state [1,0]
+        elif (self.distance_to_apple < self.object_radius) and self.state == [1, 0]:
+            self.score = -700
+        elif self.distance_to_apple <= 5 and self.state == [1, 0]:
+            self.score = -500
+        elif (self.distance_to_apple > 5 and self.distance_to_apple <= 10) and self.state == [1, 0]:
+            self.score = -400
+        elif (self.distance_to_apple > 10 and self.distance_to_apple <= 15) and self.state == [1, 0]:
+            self.score = -300
+        
+        elif self.distance_to_box <= 0 and self.state == [1, 0]:
+            self.score = 30
+        elif (self.distance_to_box > 5 and self.distance_to_box <= 10) and self.state == [1, 0]:
+            self.score = 20
+        elif (self.distance_to_box > 10 and self.distance_to_box <= 15) and self.state == [1, 0]:
+            self.score = 10
+
+        # elif self.state == [0, 0]:
+        #     self.score = (-1 * self.distance_to_apple)*10
+        #     self.score = (-1 * self.distance_to_box)
+
+        elif self.state == [0, 0] :
+            self.score = (-1 * self.distance_to_apple)
+            self.score = (-1 * self.distance_to_box)*1.5
+    
+        elif self.state == [1, 0] :
+            self.score = (-1 * self.distance_to_apple)*1.5
+            self.score = (-1 * self.distance_to_box)
+
+
+def reference_reward(score, distance_to_apple, distance_to_box, state, picked=False, placed=False,
+                     object_radius=20):
+    # The chain for one arm, with the outcome of the pick / place it would try
+    if distance_to_apple < object_radius:
+        if state == [0, 0]:
+            return score + 1000 if picked else score
+        return -300
+    elif distance_to_box < object_radius:
+        if state == [1, 0]:
+            return 100_000 if placed else score
+        return -300
+    elif distance_to_apple <= 5 and state == [0, 0]:
+        return 30
+    elif (distance_to_apple > 5 and distance_to_apple <= 10) and state == [0, 0]:
+        return 20
+    elif (distance_to_apple > 10 and distance_to_apple <= 15) and state == [0, 0]:
+        return 10
+    elif distance_to_box <= 0 and state == [0, 0]:
+        return -500
+    elif (distance_to_box > 5 and distance_to_box <= 10) and state == [0, 0]:
+        return -400
+    elif (distance_to_box > 10 and distance_to_box <= 15) and state == [0, 0]:
+        return -300
+    elif (distance_to_box < object_radius) and state == [0, 0]:
+        return -700
+    elif (distance_to_apple < object_radius) and state == [1, 0]:
+        return -700
+    elif distance_to_apple <= 5 and state == [1, 0]:
+        return -500
+    elif (distance_to_apple > 5 and distance_to_apple <= 10) and state == [1, 0]:
+        return -400
+    elif (distance_to_apple > 10 and distance_to_apple <= 15) and state == [1, 0]:
+        return -300
+    elif distance_to_box <= 0 and state == [1, 0]:
+        return 30
+    elif (distance_to_box > 5 and distance_to_box <= 10) and state == [1, 0]:
+        return 20
+    elif (distance_to_box > 10 and distance_to_box <= 15) and state == [1, 0]:
+        return 10
+    elif state == [0, 0]:
+        return (-1 * distance_to_box) * 1.5
+    elif state == [1, 0]:
+        return -1 * distance_to_box
+    return score
+
+
+def check_bands(n=200_000, seed=0):
+    # Every band edge and its neighbours, plus random distances, in every state
+    rng = np.random.default_rng(seed)
+    edges = np.array([0, 5, 10, 15, 20, 30], dtype=np.float64)
+    edges = np.concatenate([edges, np.nextafter(edges, -np.inf), np.nextafter(edges, np.inf)])
+    distances = np.concatenate([edges, rng.uniform(0, 40, 200), rng.uniform(0, 800, 50)])
+    d_apple = np.concatenate([np.repeat(distances, len(distances)), rng.uniform(0, 40, n)])
+    d_box = np.concatenate([np.tile(distances, len(distances)), rng.uniform(0, 40, n)])
+    states = [[0, 0], [1, 0], [0, 1], [1, 1]]
+    state = np.array(states)[rng.integers(0, 4, len(d_apple))]
+    score = rng.uniform(-1000, 1000, len(d_apple))
+    picked = rng.random(len(d_apple)) < 0.5
+    placed = rng.random(len(d_apple)) < 0.5
+
+    bands = reward_bands()
+    batch = bands(score, d_apple, d_box, state, picked, placed)
+    for i in range(len(d_apple)):
+        row_state = state[i].tolist()
+        expected = reference_reward(score[i], d_apple[i], d_box[i], row_state, picked[i], placed[i])
+        band = bands.match(d_apple[i], d_box[i], row_state)
+        success = bool(picked[i] if bands.kind(band) == "pick" else placed[i])
+        one = bands.apply(band, score[i], d_apple[i], d_box[i], success)
+        assert batch[i] == expected and one == expected, (d_apple[i], d_box[i], row_state, expected, batch[i], one)
+    print(f"Bands match the chain on {len(d_apple)} arms")
+
+
+def check_envs(steps=50_000, seed=0):
+    # Same seeds and actions through the band env, the reference env and the batched env
+    env = CustomEnv(render_mode="rgb_array", obs_mode="vector", hud=False)
+    reference = ReferenceEnv(render_mode="rgb_array", obs_mode="vector", hud=False)
+    batch = BatchRobotEnv(1)
+    env.reset(seed=seed)
+    reference.reset(seed=seed)
+    batch.seed(seed)
+    batch.reset()
+    actions = np.random.default_rng(seed).integers(0, 4, steps)
+    for action in actions:
+        _, score, done, _, _ = env.step(action)
+        _, reference_score, reference_done, _, _ = reference.step(action)
+        batch.step_async(np.array([action]))
+        _, batch_score, batch_done, _ = batch.step_wait()
+        assert score == reference_score == batch_score[0] and done == reference_done == batch_done[0], \
+            (score, reference_score, batch_score[0])
+        assert env.state == reference.state
+        if done:
+            env.reset()
+            reference.reset()
+    print(f"Envs match the chain over {steps} steps")
+
+
+def check_table(steps=50_000, seed=0):
+    # The same seeds and actions with distances and bands measured or read from RewardLookup tables
+    env = CustomEnv(render_mode="rgb_array", obs_mode="vector", hud=False)
+    table = CustomEnv(render_mode="rgb_array", obs_mode="vector", hud=False, reward_table=True)
+    env.reset(seed=seed)
+    table.reset(seed=seed)
+    actions = np.random.default_rng(seed).integers(0, 4, steps)
+    for action in actions:
+        observation, score, done, _, _ = env.step(action)
+        table_observation, table_score, table_done, _, _ = table.step(action)
+        assert score == table_score and done == table_done, (score, table_score)
+        assert env.state == table.state and np.array_equal(observation, table_observation)
+        assert (env.distance_to_apple, env.distance_to_box) == (table.distance_to_apple, table.distance_to_box)
+        if done:
+            env.reset()
+            table.reset()
+    print(f"Reward tables match the bands over {steps} steps, {table.reward_table.rebuilds} rebuilds")
+
+
+if __name__ == "__main__":
+    check_bands()
+    check_envs()
+    check_table()
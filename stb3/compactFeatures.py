@@ -0,0 +1,25 @@
+import numpy as np
+import torch
+from gymnasium import spaces
+from stable_baselines3.common.torch_layers import BaseFeaturesExtractor, NatureCNN
+from frameRenderer import FrameRenderer
+
+
+class CompactFrameExtractor(BaseFeaturesExtractor):
+    """SB3 features extractor that draws compact env states and runs NatureCNN on the frames.
+
+    For robotEnv.CustomEnv(obs_mode="compact"): the rollout buffer keeps the compact states
+    and frames are only rendered, as uint8 scaled to [0, 1], for the batch being evaluated.
+    """
+
+    def __init__(self, observation_space, features_dim=512, obs_size=(84, 84), grayscale=False, hud=True):
+        super().__init__(observation_space, features_dim)
+        self.renderer = FrameRenderer(obs_size, grayscale, hud=hud)
+        height, width, channels = self.renderer.shape
+        image_space = spaces.Box(low=0, high=255, shape=(channels, height, width), dtype=np.uint8)
+        self.cnn = NatureCNN(image_space, features_dim)
+
+    def forward(self, observations):
+        frames = self.renderer.render(observations.detach().cpu().numpy().astype(np.float64))
+        frames = torch.as_tensor(frames, device=observations.device).permute(0, 3, 1, 2).float() / 255.0
+        return self.cnn(frames)
@@ -3,20 +3,26 @@ from gymnasium import spaces
 import numpy as np
 import pygame
 import math
-import random
-import time
+from simClock import SimClock
+from pixelObs import PixelObservation
+from hud import Hud
+from robotArm import RobotArm
+import tracing
 
 class CustomEnv(gym.Env):
     """Custom Environment that follows gym interface."""
 
-    metadata = {"render_modes": ["human"], "render_fps": 30}
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 30}
 
-    def __init__(self, screen):
+    def __init__(self, screen=None, render_mode=None, obs_size=None, grayscale=False, crop_workspace=False,
+                 hud=True):
         super().__init__()
         # Constants
         self.WIDTH, self.HEIGHT = 800, 600
         self.FPS = 60
         self.TIMER_LIMIT = 5  # Timer limit in seconds
+        self.ARM_LENGTH = 100
+        self.object_radius = 20
 
         # Colors
         self.WHITE = (255, 255, 255)
@@ -29,24 +35,55 @@ class CustomEnv(gym.Env):
         # self.action_space = spaces.Discrete(4)  # 4 discrete actions
         self.action_space = spaces.Discrete(5)  # 0: Do nothing, 1: Pick, 2: Place, 3: Rotate arm 1, 4: Rotate arm 2
 
-        self.observation_space = spaces.Box(low=0, high=255, shape=(self.HEIGHT, self.WIDTH, 3), dtype=np.uint8)
+        # A screen handed in by the caller is a display surface, keep presenting to it
+        if screen is not None and render_mode is None:
+            render_mode = "human"
+        self.render_mode = render_mode
+
+        self.screen = screen if screen is not None else self._create_screen()
+
+        # Frames are optionally cropped to the square the arm can reach around its base, resized to
+        # obs_size (width, height) and converted to grayscale
+        crop = None
+        if crop_workspace:
+            reach = 2 * self.ARM_LENGTH + self.object_radius
+            crop = pygame.Rect(self.WIDTH // 2 - reach, self.HEIGHT // 2 - reach, 2 * reach, 2 * reach)
+            crop = crop.clip(self.screen.get_rect())
+        self.pixels = PixelObservation(self.screen, size=obs_size, grayscale=grayscale, crop=crop)
+        self.observation_space = spaces.Box(low=0, high=255, shape=self.pixels.shape, dtype=np.uint8)
+
+        # The score and timer text can be dropped for training
+        self.show_hud = hud
+        self.hud = None
 
-        self.screen = screen
         self.clock = None
         self.robot_arm = None
         self.apple_pos = None
         self.box_pos = None
-        self.object_radius = 20
         self.score = 0
         self.running = True
         self.timer_start = None  # Variable to store timer start time
 
+    def _create_screen(self):
+        if self.render_mode == "human":
+            pygame.display.init()
+            return pygame.display.set_mode((self.WIDTH, self.HEIGHT))
+        # Offscreen: draw into an in-memory surface, the display module is never touched
+        return pygame.Surface((self.WIDTH, self.HEIGHT))
+
+    def _init_pygame(self):
+        if self.render_mode == "human":
+            pygame.init()
+        else:
+            pygame.font.init()  # Only the HUD text needs a pygame module
+
     def generate_apple_position(self):
         min_x = max(self.robot_arm.base_x - self.robot_arm.arm_length, 0)
         max_x = min(self.robot_arm.base_x + self.robot_arm.arm_length, self.WIDTH)
         min_y = max(self.robot_arm.base_y - self.robot_arm.arm_length, 0)
         max_y = min(self.robot_arm.base_y + self.robot_arm.arm_length, self.HEIGHT)
-        return (random.randint(min_x, max_x), random.randint(min_y, max_y))
+        # Drawn from the env's seeded generator, so each seeded worker gets its own apple sequence
+        return (int(self.np_random.integers(min_x, max_x + 1)), int(self.np_random.integers(min_y, max_y + 1)))
 
     def handle_events(self):
         for event in pygame.event.get():
@@ -75,61 +112,49 @@ class CustomEnv(gym.Env):
         pygame.draw.circle(self.screen, self.BLUE, self.apple_pos, self.object_radius)
         pygame.draw.rect(self.screen, self.BLACK, (self.box_pos[0] - self.object_radius, self.box_pos[1] - self.object_radius, self.object_radius * 2, self.object_radius * 2))
         self.robot_arm.draw()  # Remove screen argument
-        font = pygame.font.Font(None, 36)
-        score_text = font.render(f"Score: {self.score}", True, self.BLACK)
-        self.screen.blit(score_text, (10, 10))
-        if self.timer_start is not None:  # Draw timer if it's running
-            elapsed_time = time.time() - self.timer_start
-            if elapsed_time >= self.TIMER_LIMIT:  # Check if timer limit exceeded
-                self.score -= 5  # Deduct score if timer limit exceeded
-                self.timer_start = None  # Reset timer
-            else:
-                timer_text = font.render(f"Time left: {self.TIMER_LIMIT - int(elapsed_time)}s", True, self.RED)
-                self.screen.blit(timer_text, (self.WIDTH - 160, 10))
-        pygame.display.flip()
+        if self.hud is not None:
+            self.hud.text("Score: ", f"{self.score}", self.BLACK, (10, 10))
+            if self.timer_start is not None:  # Draw timer if it's running
+                elapsed_time = self.clock.elapsed(self.timer_start)
+                if elapsed_time < self.TIMER_LIMIT:
+                    self.hud.text("Time left: ", f"{self.TIMER_LIMIT - int(elapsed_time)}s", self.RED, (self.WIDTH - 160, 10))
+        if self.render_mode == "human":
+            pygame.display.flip()
+
+    def update_timer(self):
+        # The timer runs on simulated seconds, so penalties do not depend on how fast the host steps
+        if self.timer_start is not None and self.clock.elapsed(self.timer_start) >= self.TIMER_LIMIT:
+            self.score -= 5  # Deduct score if timer limit exceeded
+            self.timer_start = None  # Reset timer
 
     # def check_game_over(self):
     #     if self.score >= 10 or self.score <= -10:
     #         self.running = False
     def check_game_over(self):
         if self.score >= 10 or self.score <= -100:
-            print("Game Over condition met.")
+            tracing.event("game_over", score=self.score)
             self.running = False
 
 
-    def reset(self, seed=None):
-        pygame.init()
-        self.clock = pygame.time.Clock()
-        self.robot_arm = RobotArm(self.WIDTH // 2, self.HEIGHT // 2, 100, self.screen, self.BLACK, self.RED, self.GREEN, self.BLUE)  # Pass colors to RobotArm constructor
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        self._init_pygame()
+        if self.show_hud and self.hud is None:
+            self.hud = Hud(self.screen)
+        self.clock = SimClock(self.FPS, realtime=self.render_mode == "human")
+        self.robot_arm = RobotArm(self.WIDTH // 2, self.HEIGHT // 2, self.ARM_LENGTH, self.screen, self.BLACK, self.RED, self.GREEN, self.BLUE)  # Pass colors to RobotArm constructor
         # self.apple_pos = self.generate_apple_position()
         self.apple_pos = (250, 300)
         self.box_pos = (3 * self.WIDTH // 4, self.HEIGHT // 2)
         self.score = 0
         self.running = True
         self.timer_start = None
+        self.draw()
         return self._get_observation(), {}
 
     def _get_observation(self):
-        # Create an observation array with dimensions (HEIGHT, WIDTH, 3)
-        observation = np.zeros((self.HEIGHT, self.WIDTH, 3), dtype=np.uint8)
-        
-        # Draw the environment onto the observation array
-        self.draw()
-        
-        # Convert the observation array to a Pygame surface
-        surface = pygame.surfarray.make_surface(observation)
-        
-        # Check if the dimensions match before blitting the array
-        if surface.get_size() == self.screen.get_size():
-            pygame.surfarray.blit_array(surface, observation)
-            return observation.transpose(1, 0, 2)  # Transpose to match the expected shape
-        else:
-            # Create a resized surface to match self.screen dimensions
-            resized_surface = pygame.transform.scale(surface, self.screen.get_size())
-            
-            # Convert the resized surface back to a NumPy array
-            resized_observation = pygame.surfarray.array3d(resized_surface)
-            return resized_observation.transpose(1, 0, 2)  # Transpose to match the expected shape
+        # Reads the frame drawn last, the pixel array is reused on the next call
+        return self.pixels.read()
 
 
 
@@ -204,107 +229,61 @@ class CustomEnv(gym.Env):
         self.check_game_over()
 
         # Check if gripper passes over the target (apple)
-        end_x2 = self.robot_arm.base_x + self.robot_arm.arm_length * math.cos(math.radians(self.robot_arm.angle1)) + \
-                self.robot_arm.arm_length * math.cos(math.radians(self.robot_arm.angle2))
-        end_y2 = self.robot_arm.base_y - self.robot_arm.arm_length * math.sin(math.radians(self.robot_arm.angle1)) - \
-                self.robot_arm.arm_length * math.sin(math.radians(self.robot_arm.angle2))
-        distance_to_apple = math.sqrt((self.apple_pos[0] - end_x2) ** 2 + (self.apple_pos[1] - end_y2) ** 2)
+        end_x2, end_y2 = self.robot_arm.end_effector()
+        distance_to_apple = math.hypot(self.apple_pos[0] - end_x2, self.apple_pos[1] - end_y2)
         
         # Reward logic
         if distance_to_apple < self.object_radius:  # Gripper passes over the apple
             self.score += 100  # Reward for passing over the target
-            print(f"Score after passing over apple: {self.score}") 
+            tracing.event("apple_reached", score=self.score)
             self.apple_pos = self.generate_apple_position()  # Generate a new apple position
             self.timer_start = None  # Reset timer
         
 
 
 
-        # Draw the environment
-        self.draw()
+        # Timer penalties
+        self.update_timer()
 
-        # Clock tick
-        self.clock.tick(self.FPS)
+        # Clock tick, paced to FPS only when rendering for a human
+        self.clock.tick()
 
         # Start timer if not already started
         if self.timer_start is None:
-            self.timer_start = time.time()
+            self.timer_start = self.clock.steps
+
+        # Draw the environment once, the observation is read from this frame
+        self.draw()
+
+        observation = self._get_observation()
+        if not self.running:
+            # Vec envs keep the terminal observation across the reset that reuses the pixel array
+            observation = observation.copy()
 
         # Return observation, reward, done, and additional info
-        return self._get_observation(), self.score, not self.running, False, {}
+        return observation, self.score, not self.running, False, {}
 
 
 
 
 
-    def render(self, mode="human"):
+    def render(self, mode=None):
+        mode = mode or self.render_mode
         if mode == "human":
-            pygame.display.flip()
+            if self.render_mode == "human":
+                pygame.display.flip()
         elif mode == "rgb_array":
             self.draw()
-            observation = self._get_observation()
-            return observation
+            return pygame.surfarray.array3d(self.screen).transpose(1, 0, 2)
         else:
             raise NotImplementedError("Only human and rgb_array rendering modes are supported.")
 
 
 
     def close(self):
+        self.hud = None  # Its font dies with pygame
         pygame.quit()
 
-class RobotArm:
-    def __init__(self, base_x, base_y, arm_length, screen, BLACK, RED, GREEN, BLUE):
-        self.base_x = base_x
-        self.base_y = base_y
-        self.arm_length = arm_length
-        self.angle1 = 0
-        self.angle2 = 0
-        self.holding = None
-        self.screen = screen  # Store the screen object
-        self.BLACK = BLACK
-        self.RED = RED
-        self.GREEN = GREEN
-        self.BLUE = BLUE
-
-    def update(self, angle1_change, angle2_change):
-        self.angle1 += angle1_change
-        self.angle2 += angle2_change
-
-    def draw(self):  # Remove screen argument
-        end_x1 = self.base_x + self.arm_length * math.cos(math.radians(self.angle1))
-        end_y1 = self.base_y - self.arm_length * math.sin(math.radians(self.angle1))
-        end_x2 = end_x1 + self.arm_length * math.cos(math.radians(self.angle2))
-        end_y2 = end_y1 - self.arm_length * math.sin(math.radians(self.angle2))
-        pygame.draw.line(self.screen, self.BLACK, (self.base_x, self.base_y), (end_x1, end_y1), 5)
-        pygame.draw.line(self.screen, self.BLACK, (end_x1, end_y1), (end_x2, end_y2), 5)
-        pygame.draw.circle(self.screen, self.RED, (int(end_x2), int(end_y2)), 10)
-        if self.holding:
-            pygame.draw.circle(self.screen, self.GREEN, (int(end_x2), int(end_y2)), 15)
-
-    def pick(self, object_pos, object_radius):
-        end_x2 = self.base_x + self.arm_length * math.cos(math.radians(self.angle1)) + \
-                 self.arm_length * math.cos(math.radians(self.angle2))
-        end_y2 = self.base_y - self.arm_length * math.sin(math.radians(self.angle1)) - \
-                 self.arm_length * math.sin(math.radians(self.angle2))
-        distance = math.sqrt((object_pos[0] - end_x2) ** 2 + (object_pos[1] - end_y2) ** 2)
-        if distance < object_radius:
-            self.holding = object_pos
-            return True
-        else:
-            return False
-
-    def place(self, target_pos, target_radius):
-        if self.holding:
-            end_x2 = self.base_x + self.arm_length * math.cos(math.radians(self.angle1)) + \
-                     self.arm_length * math.cos(math.radians(self.angle2))
-            end_y2 = self.base_y - self.arm_length * math.sin(math.radians(self.angle1)) - \
-                     self.arm_length * math.sin(math.radians(self.angle2))
-            distance = math.sqrt((target_pos[0] - end_x2) ** 2 + (target_pos[1] - end_y2) ** 2)
-            if distance < target_radius:
-                self.holding = None
-                return True
-        return False
-
 # For testing the environment
 # if __name__ == "__main__":
 #     pygame.init()
@@ -1,9 +1,10 @@
+import argparse
 import math, random
+import threading
 
 import torch
 import torch.nn as nn
 import torch.optim as optim
-import torch.autograd as autograd 
 import torch.nn.functional as F
 
 import matplotlib.pyplot as plt
@@ -11,9 +12,13 @@ import matplotlib.pyplot as plt
 import gymnasium as gym
 import numpy as np
 
-from collections import deque
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
 from tqdm import trange
 
+from replayBuffer import ReplayBuffer, PrioritizedReplayBuffer, HerReplayBuffer
+from prefetcher import BatchPrefetcher
+from rateLimiter import ReplayRatioLimiter
+
 # Select GPU or CPU as device
 
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
@@ -31,94 +36,121 @@ epsilon_final = 0.01
 epsilon_decay = 500
 eps_by_episode = gen_eps_by_episode(epsilon_start, epsilon_final, epsilon_decay)
 
-class ReplayBuffer(object):
-    def __init__(self, capacity):
-        self.buffer = deque(maxlen=capacity)
-    
-    def push(self, state, action, reward, next_state, done):
-        # Add batch index dimension to state representations
-        state = np.expand_dims(state, 0)
-        next_state = np.expand_dims(next_state, 0)            
-        self.buffer.append((state, action, reward, next_state, done))
-    
-    def sample(self, batch_size):
-        state, action, reward, next_state, done = zip(*random.sample(self.buffer, batch_size))
-        return np.concatenate(state), action, reward, np.concatenate(next_state), done
-    
-    def __len__(self):
-        return len(self.buffer)
-
-
-    
+# Prioritized replay (--prioritized): sampling exponent alpha, importance-sampling exponent annealed
+# from beta_start to 1
+alpha = 0.6
+beta_start = 0.4
+beta_episodes = 10000
+beta_by_episode = lambda episode: min(1.0, beta_start + episode * (1.0 - beta_start) / beta_episodes)
+
+# Training iterations between copies of the online network into the target network
+target_update = 1000
+
+# Actor/learner mode: learner updates between policy copies handed to the actors
+policy_refresh = 100
+
 class DQN(nn.Module):
     def __init__(self, n_state, n_action):
-        super(DQN, self).__init__()        
+        super(DQN, self).__init__()
+        self.n_action = n_action
         self.layers = nn.Sequential(
-            nn.Linear(n_state, 256),  # Adjust input size to match n_state
+            nn.Linear(n_state, 256),  # n_state is the flattened observation size
             nn.ReLU(),
             nn.Linear(256, 128),
             nn.ReLU(),
             nn.Linear(128, n_action)
         )
-        
+
     def forward(self, x):
-        return self.layers(x)
-    
-    def act(self, state, epsilon):
-        # Get an epsilon greedy action for given state
-        if random.random() > epsilon: # Use argmax_a Q(s,a)
-            state = autograd.Variable(torch.FloatTensor(state).unsqueeze(0), volatile=True).to(device)
-            q_value = self.forward(state)
-            q_value = q_value.cpu()
-            action = q_value.max(1)[1].item()            
-        else: # get random action
-            action = random.randrange(env.action_space.n)
-        return action
-
-from customENV import CustomEnv
-import pygame
-
-screen = pygame.display.set_mode((800, 600))
-
-env = CustomEnv(screen)
-# env = gym.make(env_id)
-
-model = DQN(env.observation_space.shape[0], env.action_space.n).to(device)
-    
-optimizer = optim.Adam(model.parameters())
-
-replay_buffer = ReplayBuffer(1000)
-
-def compute_td_loss(model, batch_size, gamma=0.99):
-
-    # Get batch from replay buffer
-    state, action, reward, next_state, done = replay_buffer.sample(batch_size)
-
-    # Convert to tensors. Creating Variables is not necessary with more recent PyTorch versions.
-    state      = autograd.Variable(torch.FloatTensor(np.float32(state))).to(device)
-    next_state = autograd.Variable(torch.FloatTensor(np.float32(next_state)), volatile=True).to(device)
-    action     = autograd.Variable(torch.LongTensor(action)).to(device)
-    reward     = autograd.Variable(torch.FloatTensor(reward)).to(device)
-    done       = autograd.Variable(torch.FloatTensor(done)).to(device)
-
-    # Calculate Q(s) and Q(s')
-    q_values      = model(state)
-    next_q_values = model(next_state)
-
-    # Get Q(s,a) and max_a' Q(s',a')
-    q_value          = q_values.gather(1, action.unsqueeze(1)).squeeze(1)
-    next_q_value     = next_q_values.max(1)[0]
-    # Calculate target for Q(s,a): r + gamma max_a' Q(s',a')
-    # Note that the done signal is used to terminate recursion at end of episode.
-    expected_q_value = reward + gamma * next_q_value * (1 - done)
-    
-    # Calculate MSE loss. Variables are not needed in recent PyTorch versions.
-    loss = (q_value - autograd.Variable(expected_q_value.data)).pow(2).mean()
-        
+        # Observations of any shape are flattened per sample, frames included
+        return self.layers(x.flatten(1))
+
+    def act(self, states, epsilon):
+        # Epsilon-greedy actions for a batch of states, one per env, from one forward pass
+        with torch.inference_mode():
+            q_values = self.forward(torch.as_tensor(states, dtype=torch.float32, device=device))
+        actions = q_values.argmax(1).cpu().numpy()
+        explore = np.random.random(len(actions)) < epsilon
+        actions[explore] = np.random.randint(self.n_action, size=int(explore.sum()))
+        return actions
+
+def make_env(rank, env_name="customENV", obs_size=None, grayscale=False, compact=False, goal=False):
+    # Headless env: frames are drawn offscreen, no window is opened. env_name is the module the env
+    # comes from, customENV or robotEnv, which reward the arm differently. A compact robotEnv draws
+    # nothing, its states are rendered on demand by a frameRenderer.FrameRenderer. A goal robotEnv
+    # returns flattened goalEnv.GoalRobotEnv observations: achieved goal, desired goal, arm features
+    def _init():
+        if env_name == "customENV":
+            from customENV import CustomEnv
+            return CustomEnv(render_mode="rgb_array", obs_size=obs_size, grayscale=grayscale)
+        from robotEnv import CustomEnv
+        if goal:
+            from goalEnv import GoalRobotEnv
+            return gym.wrappers.FlattenObservation(GoalRobotEnv(CustomEnv(obs_mode="vector", hud=False)))
+        if compact:
+            return CustomEnv(render_mode="rgb_array", obs_mode="compact")
+        return CustomEnv(render_mode="rgb_array", obs_size=obs_size, grayscale=grayscale)
+    return _init
+
+def make_vec_env(args, seed):
+    # The VecEnv one trainer or actor steps, its envs seeded seed, seed + 1, ...
+    if args.batch_env:
+        from batchEnv import BatchRobotEnv
+        env = BatchRobotEnv(args.n_envs)
+    else:
+        env_fns = [make_env(rank, args.env, args.obs_size, args.grayscale, args.render_on_sample, args.her)
+                   for rank in range(args.n_envs)]
+        if args.n_envs == 1:
+            env = DummyVecEnv(env_fns)
+        elif args.shm:
+            from shmVecEnv import SharedMemoryVecEnv
+            env = SharedMemoryVecEnv(env_fns)
+        else:
+            env = SubprocVecEnv(env_fns)
+    env.seed(seed)
+    return env
+
+def terminal_next_state(next_state, done, infos):
+    # The true next state of a finished env is its terminal observation, not the reset one
+    if not done.any():
+        return next_state
+    next_state = next_state.copy()
+    for env_idx in np.flatnonzero(done):
+        next_state[env_idx] = infos[env_idx]["terminal_observation"]
+    return next_state
+
+def compute_td_loss(model, target_model, optimizer, prefetcher, gamma=0.99):
+
+    # Get a batch the prefetcher already sampled and moved to the device as tensors.
+    # Prioritized batches come with importance-sampling weights, uniform ones with ones.
+    state, action, reward, next_state, done, weights, indices = prefetcher.get()
+
+    # Calculate Q(s,a)
+    q_values = model(state)
+    q_value  = q_values.gather(1, action.unsqueeze(1)).squeeze(1)
+
+    # Double DQN: the online network picks a' = argmax_a' Q(s',a'), the target network values it
+    with torch.no_grad():
+        next_action      = model(next_state).argmax(1, keepdim=True)
+        next_q_value     = target_model(next_state).gather(1, next_action).squeeze(1)
+        # Calculate target for Q(s,a): r + gamma Q_target(s',a')
+        # Note that the done signal is used to terminate recursion at end of episode.
+        expected_q_value = reward + gamma * next_q_value * (1 - done)
+
+    # Calculate MSE loss, weighted per sample
+    td_error = q_value - expected_q_value
+    loss = (weights * td_error.pow(2)).mean()
+
     optimizer.zero_grad()
     loss.backward()
     optimizer.step()
 
+    # New priorities from this batch's TD errors
+    if prefetcher.prioritized:
+        td_error = td_error.detach().cpu().numpy()
+        with prefetcher.lock:
+            prefetcher.replay_buffer.update_priorities(indices, td_error)
+
     return loss
 
 def plot(episode, rewards, losses):
@@ -129,51 +161,249 @@ def plot(episode, rewards, losses):
     plt.plot(rewards)
     plt.subplot(132)
     plt.title('loss')
-    plt.plot(losses)   
-    plt.show() 
+    plt.plot(losses)
+    plt.show()
 
-def train(env, model, eps_by_episode, optimizer, replay_buffer, episodes = 10000, batch_size=32, gamma = 0.99):
+def train(env, model, target_model, eps_by_episode, optimizer, replay_buffer, episodes = 10000, batch_size=32, gamma = 0.99,
+          renderer=None):
+    # env is a VecEnv: each iteration steps all of its envs and trains on one batch. With a
+    # renderer env returns compact states, which are stored as they are and drawn to act on
     losses = []
     all_rewards = []
-    episode_reward = 0
+    episode_reward = np.zeros(env.num_envs)
     tot_reward = 0
     tr = trange(episodes+1, desc='Agent training', leave=True)
 
-    # Get initial state input
-    state, info = env.reset()
+    # Batches are sampled and converted on a background thread while the learner trains
+    prefetcher = BatchPrefetcher(replay_buffer, batch_size, device)
+
+    # Get initial state inputs, one row per env
+    state = env.reset()
 
     # Execute episodes iterations
     for episode in tr:
-        tr.set_description("Agent training (episode{}) Avg Reward {}".format(episode+1,tot_reward/(episode+1)))
-        tr.refresh() 
+        tr.set_description("Agent training (episode{}) Avg Reward {}".format(episode+1,tot_reward/((episode+1)*env.num_envs)))
+        tr.refresh()
 
-        # Get initial epsilon greedy action
+        # Get epsilon greedy actions for every env
         epsilon = eps_by_episode(episode)
-        action = model.act(state, epsilon)
-        
-        # Take a step
-        next_state, reward, done, _, info = env.step(action)
+        action = model.act(state if renderer is None else renderer.render(state), epsilon)
+
+        # Take a step in every env; finished envs are reset by the VecEnv
+        next_state, reward, done, infos = env.step(action)
 
-        # Append experience to replay buffer
-        replay_buffer.push(state, action, reward, next_state, done)
+        # Append experience to replay buffer, the prefetch thread may be reading it
+        with prefetcher.lock:
+            replay_buffer.extend(state, action, reward, terminal_next_state(next_state, done, infos), done, infos)
 
-        tot_reward += reward
+        tot_reward += reward.sum()
         episode_reward += reward
-        
+
         state = next_state
 
-        # Start a new episode if done signal is received
-        if done:
-            state, info = env.reset()
-            all_rewards.append(episode_reward)
-            episode_reward = 0
+        # Record finished episodes
+        for env_idx in np.flatnonzero(done):
+            all_rewards.append(episode_reward[env_idx])
+            episode_reward[env_idx] = 0
 
         # Train on a batch if we've got enough experience
         if len(replay_buffer) > batch_size:
-            loss = compute_td_loss(model, batch_size, gamma)
+            prefetcher.beta = beta_by_episode(episode)
+            loss = compute_td_loss(model, target_model, optimizer, prefetcher, gamma)
             losses.append(loss.item())
-            
-    plot(episode, all_rewards, losses)  
+
+        # Sync the target network
+        if episode % target_update == 0:
+            target_model.load_state_dict(model.state_dict())
+
+    prefetcher.close()
+    plot(episode, all_rewards, losses)
+    return model, all_rewards, losses
+
+def snapshot(model):
+    # A copy of the weights the learner keeps training past
+    return {name: tensor.detach().clone() for name, tensor in model.state_dict().items()}
+
+def run_actor(env, model, policy, eps_by_episode, prefetcher, limiter, all_rewards, errors, renderer=None):
+    # Steps env with its own copy of the policy, reloaded whenever the learner publishes a new
+    # one, and fills the replay buffer until the limiter is closed. An exception is kept in errors
+    # and closes the limiter, so the learner and the other actors stop instead of waiting forever
+    replay_buffer = prefetcher.replay_buffer
+    version = None
+    episode_reward = np.zeros(env.num_envs)
+    try:
+        state = env.reset()
+        step = 0
+        while True:
+            if policy[0][0] != version:
+                version, state_dict = policy[0]
+                model.load_state_dict(state_dict)
+
+            action = model.act(state if renderer is None else renderer.render(state), eps_by_episode(step))
+            next_state, reward, done, infos = env.step(action)
+
+            with prefetcher.lock:
+                replay_buffer.extend(state, action, reward, terminal_next_state(next_state, done, infos), done, infos)
+            state = next_state
+            step += 1
+
+            episode_reward += reward
+            for env_idx in np.flatnonzero(done):
+                all_rewards.append(episode_reward[env_idx])
+                episode_reward[env_idx] = 0
+
+            # Blocks while the actors are ahead of the replay ratio
+            if not limiter.insert(env.num_envs):
+                return
+    except BaseException as error:
+        errors.append(error)
+    finally:
+        limiter.close()
+
+def train_async(envs, model, target_model, eps_by_episode, optimizer, replay_buffer, updates = 10000, batch_size=32,
+                gamma = 0.99, replay_ratio = 8.0, renderers=None):
+    # Ape-X style local mode: one actor thread per VecEnv in envs fills the replay buffer while
+    # this thread, the learner, trains. replay_ratio is transitions sampled per transition inserted.
+    # renderers, one per actor, draw compact states to act on as in train()
+    losses = []
+    all_rewards = []
+
+    prefetcher = BatchPrefetcher(replay_buffer, batch_size, device)
+    tolerance = batch_size + replay_ratio * max(env.num_envs for env in envs)
+    limiter = ReplayRatioLimiter(replay_ratio, min_size=batch_size + 1, tolerance=tolerance)
+
+    # (version, weights) the actors act with, replaced every policy_refresh updates
+    policy = [(0, snapshot(model))]
+    actors = []
+    errors = []
+    for env, renderer in zip(envs, renderers or [None] * len(envs)):
+        actor_model = DQN(model.layers[0].in_features, model.n_action).to(device)
+        thread = threading.Thread(target=run_actor, daemon=True,
+                                  args=(env, actor_model, policy, eps_by_episode, prefetcher, limiter, all_rewards,
+                                        errors, renderer))
+        thread.start()
+        actors.append(thread)
+
+    tr = trange(updates+1, desc='Learner', leave=True)
+    for update in tr:
+        # Blocks until the actors have inserted enough for another batch
+        if not limiter.sample(batch_size):
+            break
+        prefetcher.beta = beta_by_episode(update)
+        loss = compute_td_loss(model, target_model, optimizer, prefetcher, gamma)
+        losses.append(loss.item())
+
+        if update % target_update == 0:
+            target_model.load_state_dict(model.state_dict())
+        if update % policy_refresh == 0:
+            policy[0] = (update, snapshot(model))
+
+        if update % 100 == 0:
+            tr.set_description("Learner (update{}) transitions {} Avg Reward {}".format(
+                update + 1, limiter.inserted, np.mean(all_rewards[-10:]) if all_rewards else 0.0))
+
+    limiter.close()
+    for thread in actors:
+        thread.join()
+    prefetcher.close()
+    if errors:
+        raise RuntimeError(f"{len(errors)} actor thread(s) failed") from errors[0]
+    plot(update, all_rewards, losses)
     return model, all_rewards, losses
 
-model,all_rewards, losses = train(env, model, eps_by_episode, optimizer, replay_buffer, episodes = 10000, batch_size=1024, gamma = 0.99)
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a Double DQN on the 2DoF robot arm env.")
+    parser.add_argument("--n-envs", type=int, default=8, help="Envs stepped together each iteration")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed, env i is seeded with seed + i")
+    parser.add_argument("--env", choices=["customENV", "robotEnv"], default="customENV",
+                        help="Env module to train on, the two reward the arm differently; --batch-env, "
+                             "--render-on-sample and --her need robotEnv")
+    parser.add_argument("--shm", action="store_true", help="Return worker frames through shared memory, not pipes")
+    parser.add_argument("--batch-env", action="store_true",
+                        help="Step vector-observation robotEnv arms in one BatchRobotEnv instead of rendered workers")
+    parser.add_argument("--obs-size", type=int, nargs=2, default=(84, 84), metavar=("WIDTH", "HEIGHT"),
+                        help="Resize frames to WIDTH x HEIGHT, 800 600 keeps the full frame")
+    parser.add_argument("--grayscale", action="store_true", help="Single-channel frames")
+    parser.add_argument("--episodes", type=int, default=10000, help="Training iterations, each steps every env; learner updates with --actors")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--buffer-size", type=int, default=10000)
+    parser.add_argument("--replay-path", default=None,
+                        help="Keep the replay buffer in memory-mapped files in this directory, resuming it if present")
+    parser.add_argument("--actors", type=int, default=0,
+                        help="Actor threads, each with its own --n-envs envs, training alongside a learner thread; "
+                             "0 alternates acting and learning in one loop")
+    parser.add_argument("--replay-ratio", type=float, default=8.0,
+                        help="With --actors, transitions sampled by the learner per transition inserted")
+    parser.add_argument("--compress", choices=["zlib", "lz4"], default=None,
+                        help="Keep replay frames compressed, decompressing only sampled batches")
+    parser.add_argument("--prioritized", action="store_true",
+                        help="Sample transitions in proportion to their TD error instead of uniformly")
+    parser.add_argument("--render-on-sample", action="store_true",
+                        help="Step compact-state robotEnv envs, store only their states and draw frames when needed")
+    parser.add_argument("--her", action="store_true",
+                        help="Goal-conditioned vector envs with hindsight relabeling of sampled transitions")
+    parser.add_argument("--her-ratio", type=float, default=0.8, help="With --her, share of each batch relabeled")
+    args = parser.parse_args()
+    # These all run robotEnv's task, so they must not quietly replace a customENV run
+    for flag, used in (("--batch-env", args.batch_env), ("--render-on-sample", args.render_on_sample),
+                       ("--her", args.her)):
+        if used and args.env != "robotEnv":
+            parser.error(f"{flag} steps robotEnv envs, a different task from {args.env}; pass --env robotEnv")
+    if args.render_on_sample and args.batch_env:
+        parser.error("--render-on-sample needs compact-state env workers, BatchRobotEnv only has vector observations")
+    if args.her and (args.actors > 1 or args.batch_env or args.compress or args.render_on_sample or args.replay_path
+                     or args.prioritized):
+        parser.error("--her runs goal-conditioned vector envs with a uniform in-memory buffer and at most one actor")
+
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
+
+    envs = [make_vec_env(args, args.seed + i * args.n_envs) for i in range(max(args.actors, 1))]
+    env = envs[0]
+
+    # Compact states are drawn as --obs-size frames: one renderer per actor, one for the replay buffer
+    renderers = None
+    buffer_renderer = None
+    if args.render_on_sample:
+        from frameRenderer import FrameRenderer
+        renderers = [FrameRenderer(args.obs_size, args.grayscale) for _ in envs]
+        buffer_renderer = FrameRenderer(args.obs_size, args.grayscale)
+
+    # Size the input layer from the whole observation, e.g. height * width * channels for frames
+    observation_space = env.observation_space if buffer_renderer is None else buffer_renderer.observation_space
+    n_state = int(np.prod(observation_space.shape))
+    model = DQN(n_state, env.action_space.n).to(device)
+    target_model = DQN(n_state, env.action_space.n).to(device)
+    target_model.load_state_dict(model.state_dict())
+
+    optimizer = optim.Adam(model.parameters())
+
+    if args.her:
+        from goalEnv import compute_reward, compute_done, GOAL_INFO
+        replay_buffer = HerReplayBuffer(args.buffer_size, args.n_envs, compute_reward, compute_done, GOAL_INFO,
+                                        args.her_ratio)
+    elif args.prioritized:
+        replay_buffer = PrioritizedReplayBuffer(args.buffer_size, alpha, path=args.replay_path, compress=args.compress,
+                                                renderer=buffer_renderer)
+    else:
+        replay_buffer = ReplayBuffer(args.buffer_size, path=args.replay_path, compress=args.compress,
+                                     renderer=buffer_renderer)
+    print(f"Replay buffer: {len(replay_buffer)} transitions")
+
+    if args.actors:
+        model, all_rewards, losses = train_async(envs, model, target_model, eps_by_episode, optimizer, replay_buffer,
+                                                 updates=args.episodes, batch_size=args.batch_size, gamma=0.99,
+                                                 replay_ratio=args.replay_ratio, renderers=renderers)
+    else:
+        model, all_rewards, losses = train(env, model, target_model, eps_by_episode, optimizer, replay_buffer,
+                                           episodes=args.episodes, batch_size=args.batch_size, gamma=0.99,
+                                           renderer=renderers and renderers[0])
+    replay_buffer.flush()
+    if args.compress or args.render_on_sample:
+        stats = replay_buffer.stats()
+        print("Replay frames: {:.1f} MB stored for {:.1f} MB raw ({:.1f}x), {} shared, {:.3f} ms per decoded frame".format(
+            stats["stored_bytes"] / 1e6, stats["raw_bytes"] / 1e6, stats["ratio"], stats["shared_frames"],
+            stats["decode_ms_per_frame"]))
+    for env in envs:
+        env.close()
@@ -0,0 +1,33 @@
+import numpy as np
+from robotEnv import CustomEnv
+
+
+class FrameRenderer:
+    """Turns robotEnv.CustomEnv(obs_mode="compact") observations back into pixel observations.
+
+    Holds one offscreen pixel-mode env with the given frame options and, for every row of
+    a batch, restores its compact state and redraws it, so the frames match what a pixel
+    env would have returned. Used by replay storage that keeps only compact states and
+    renders the sampled batch.
+    """
+
+    def __init__(self, obs_size=None, grayscale=False, crop_workspace=False, hud=True):
+        self.env = CustomEnv(render_mode="rgb_array", obs_size=obs_size, grayscale=grayscale,
+                             crop_workspace=crop_workspace, hud=hud)
+        self.env.reset()
+        self.observation_space = self.env.observation_space
+        self.shape = self.observation_space.shape
+
+    def render(self, states, out=None):
+        # (batch, height, width, channels) uint8 frames for a (batch, len(COMPACT_FIELDS)) array
+        states = np.asarray(states)
+        if out is None:
+            out = np.empty((len(states),) + self.shape, dtype=np.uint8)
+        for row, state in enumerate(states):
+            self.env.set_compact_state(state)
+            self.env.draw()
+            out[row] = self.env.pixels.read()
+        return out
+
+    def close(self):
+        self.env.close()
@@ -0,0 +1,138 @@
+import gymnasium as gym
+from gymnasium import spaces
+import numpy as np
+from robotArm import cos_sin
+from rewards import reward_bands, hypot
+
+# Entries of robotEnv.CustomEnv._get_vector_observation kept as the goal-free observation:
+# joint sin / cos, end effector and robot state, not the apple, box or distances
+ARM_FEATURES = [0, 1, 2, 3, 4, 5, 12, 13]
+
+# Step info entries compute_reward reads, with their sizes
+GOAL_INFO = {"moved_goal": 2, "apple_pos": 2, "box_pos": 2, "state": 2, "score": 1, "holding": 1,
+             "timer_state": 1, "timer_penalty": 1}
+
+
+def _band_reward(achieved_goal, desired_goal, info, object_radius):
+    # Score after the band rewards of CustomEnv.step, before the timer, and whether the step placed
+    achieved = np.asarray(achieved_goal, dtype=np.float64).reshape(-1, 2)
+    desired = np.asarray(desired_goal, dtype=np.float64).reshape(-1, 2)
+    moved = np.asarray(info["moved_goal"], dtype=np.float64).reshape(-1, 2)
+    state = np.asarray(info["state"]).reshape(-1, 2).astype(np.int8)
+    score = np.asarray(info["score"], dtype=np.float64).reshape(-1)
+    holding = np.asarray(info["holding"]).reshape(-1).astype(bool)
+
+    state_00 = (state[:, 0] == 0) & (state[:, 1] == 0)
+    state_10 = (state[:, 0] == 1) & (state[:, 1] == 0)
+    apple = np.where(state_00[:, None], desired, np.asarray(info["apple_pos"], dtype=np.float64).reshape(-1, 2))
+    box = np.where(state_00[:, None], np.asarray(info["box_pos"], dtype=np.float64).reshape(-1, 2), desired)
+
+    # Same hypot as the env, so distances sitting on a band edge fall on the same side
+    distance_to_apple = hypot(apple[:, 0] - achieved[:, 0], apple[:, 1] - achieved[:, 1]).astype(np.float64)
+    distance_to_box = hypot(box[:, 0] - achieved[:, 0], box[:, 1] - achieved[:, 1]).astype(np.float64)
+
+    # Pick / place test the pose after the first update, like RobotArm.pick / place
+    near_apple = distance_to_apple < object_radius
+    near_box = ~near_apple & (distance_to_box < object_radius)
+    picked = near_apple & state_00 & \
+        (hypot(apple[:, 0] - moved[:, 0], apple[:, 1] - moved[:, 1]).astype(np.float64) < object_radius)
+    placed = near_box & state_10 & holding & \
+        (hypot(box[:, 0] - moved[:, 0], box[:, 1] - moved[:, 1]).astype(np.float64) < object_radius)
+
+    return reward_bands(object_radius)(score, distance_to_apple, distance_to_box, state, picked, placed), placed
+
+
+def compute_reward(achieved_goal, desired_goal, info, object_radius=20):
+    """Reward CustomEnv.step gives for reaching achieved_goal while after desired_goal.
+
+    Vectorized over any leading batch shape. achieved_goal is the end effector before the
+    step, which is where the env measures its distances; desired_goal stands in for the
+    apple before the pick and for the box after it. info maps the GOAL_INFO names to arrays
+    with the same leading shape, as collected from step infos.
+    """
+    batch_shape = np.shape(achieved_goal)[:-1]
+    reward, _ = _band_reward(achieved_goal, desired_goal, info, object_radius)
+    timer_penalty = np.asarray(info["timer_penalty"], dtype=np.float64).reshape(-1)
+    return (reward + timer_penalty).reshape(batch_shape)
+
+
+def compute_done(achieved_goal, desired_goal, info, object_radius=20):
+    """Whether CustomEnv.step ends the episode for the same step, taking the same arguments
+    as compute_reward. Follows check_game_over, which runs before the timer: the score
+    bounds, a place, or the timer state the step started with."""
+    batch_shape = np.shape(achieved_goal)[:-1]
+    score, placed = _band_reward(achieved_goal, desired_goal, info, object_radius)
+    timer_state = np.asarray(info["timer_state"], dtype=np.float64).reshape(-1)
+    done = (score >= 10_000) | (score <= -1000) | placed | (timer_state >= 4)
+    return done.reshape(batch_shape)
+
+
+class GoalRobotEnv(gym.Wrapper):
+    """Goal-conditioned view of robotEnv.CustomEnv(obs_mode="vector"), for hindsight relabeling.
+
+    Observations are dicts: observation holds ARM_FEATURES of the vector observation,
+    achieved_goal the end effector and desired_goal the current target, the apple before
+    the pick and the box after it, both in screen pixels. Step infos carry achieved_goal
+    (the end effector before the step) and the GOAL_INFO entries, so compute_reward can
+    replay the step's reward for any other goal.
+    """
+
+    def __init__(self, env):
+        if env.unwrapped.obs_mode != "vector":
+            raise ValueError("GoalRobotEnv needs a CustomEnv with obs_mode='vector'")
+        super().__init__(env)
+        goal_space = spaces.Box(low=-np.inf, high=np.inf, shape=(2,), dtype=np.float64)
+        self.observation_space = spaces.Dict({
+            "observation": spaces.Box(low=-1.0, high=1.0, shape=(len(ARM_FEATURES),), dtype=np.float64),
+            "achieved_goal": goal_space,
+            "desired_goal": goal_space,
+        })
+
+    def _goal_observation(self, observation):
+        env = self.env.unwrapped
+        target = env.apple_pos if env.state == [0, 0] else env.box_pos
+        return {
+            "observation": observation[ARM_FEATURES].astype(np.float64),
+            "achieved_goal": np.array(env.robot_arm.end_effector(), dtype=np.float64),
+            "desired_goal": np.array(target, dtype=np.float64),
+        }
+
+    def reset(self, **kwargs):
+        observation, info = self.env.reset(**kwargs)
+        return self._goal_observation(observation), info
+
+    def step(self, action):
+        env = self.env.unwrapped
+        arm = env.robot_arm
+        angle1, angle2 = arm.angle1, arm.angle2
+        info_before = {
+            "achieved_goal": np.array(arm.end_effector(), dtype=np.float64),
+            "apple_pos": np.array(env.apple_pos, dtype=np.float64),
+            "box_pos": np.array(env.box_pos, dtype=np.float64),
+            "state": np.array(env.state, dtype=np.float64),
+            "score": float(env.score),
+            "holding": float(bool(arm.holding)),
+            "timer_state": float(env.TIMER_STATE),
+        }
+        observation, reward, terminated, truncated, info = self.env.step(action)
+
+        # Both updates of a step turn the joints by the same change, the first lands halfway
+        info.update(info_before)
+        info["moved_goal"] = np.array(self._end_effector((angle1 + arm.angle1) / 2, (angle2 + arm.angle2) / 2))
+        info["timer_penalty"] = float(env.timer_penalty)
+        return self._goal_observation(observation), reward, terminated, truncated, info
+
+    def _end_effector(self, angle1, angle2):
+        # RobotArm forward kinematics, summed in the same order
+        arm = self.env.unwrapped.robot_arm
+        cos1, sin1 = cos_sin(angle1)
+        cos2, sin2 = cos_sin(angle2)
+        end_x1 = arm.base_x + arm.arm_length * cos1
+        end_y1 = arm.base_y - arm.arm_length * sin1
+        return end_x1 + arm.arm_length * cos2, end_y1 - arm.arm_length * sin2
+
+    def compute_reward(self, achieved_goal, desired_goal, info):
+        return compute_reward(achieved_goal, desired_goal, info, self.env.unwrapped.object_radius)
+
+    def compute_done(self, achieved_goal, desired_goal, info):
+        return compute_done(achieved_goal, desired_goal, info, self.env.unwrapped.object_radius)
@@ -0,0 +1,27 @@
+import pygame
+
+
+class Hud:
+    """Debug text overlay that keeps its font and rendered glyphs between frames.
+
+    Each line is a static label plus a value. Labels are rendered once, values are
+    re-rendered only when their text or colour changes.
+    """
+
+    def __init__(self, screen, font_size=36):
+        self.screen = screen
+        self.font = pygame.font.Font(None, font_size)
+        self._labels = {}  # (label, color) -> surface
+        self._values = {}  # label -> (value, color, surface)
+
+    def text(self, label, value, color, pos):
+        label_surface = self._labels.get((label, color))
+        if label_surface is None:
+            label_surface = self._labels[(label, color)] = self.font.render(label, True, color)
+
+        cached = self._values.get(label)
+        if cached is None or cached[0] != value or cached[1] != color:
+            cached = self._values[label] = (value, color, self.font.render(value, True, color))
+
+        self.screen.blit(label_surface, pos)
+        self.screen.blit(cached[2], (pos[0] + label_surface.get_width(), pos[1]))
@@ -3,7 +3,6 @@ from stable_baselines3.common.monitor import Monitor
 import matplotlib.pyplot as plt
 import numpy as np
 from robotEnv import CustomEnv
-import pygame
 import time
 import json
 
@@ -11,9 +10,8 @@ import json
 episode_times = {}
 
 
-screen = pygame.display.set_mode((800, 600))
-
-env = CustomEnv(screen)
+# The env opens its own window in human mode
+env = CustomEnv(render_mode="human")
 
 model_path = "/home/two-asus/Documents/ait/drl/2d-robot-arm-2DoF-DRL/stb3/report/A2C_MLP_Robot2DoF/model/30000.zip"
 
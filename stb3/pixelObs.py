@@ -0,0 +1,44 @@
+import numpy as np
+import pygame
+
+
+class PixelObservation:
+    """Turns the env's persistent drawing surface into an observation array.
+
+    The frame is read through a pixels3d view of the surface (no copy) into one
+    preallocated uint8 array, optionally cropped, resized and converted to grayscale on
+    the way. The returned array is overwritten by the next read(), copy it to keep it.
+    """
+
+    def __init__(self, surface, size=None, grayscale=False, crop=None):
+        # crop is a (x, y, width, height) rect in surface coordinates, size is (width, height)
+        self.source = surface.subsurface(pygame.Rect(crop)) if crop is not None else surface
+        source_size = self.source.get_size()
+        self.size = tuple(size) if size is not None else source_size
+        self.grayscale = grayscale
+
+        # Persistent intermediate surfaces, in the source's pixel format
+        self.scaled = pygame.Surface(self.size, 0, self.source) if self.size != source_size else None
+        self.gray = pygame.Surface(self.size, 0, self.source) if grayscale else None
+
+        self.shape = (self.size[1], self.size[0], 1 if grayscale else 3)
+        self.observation = np.empty(self.shape, dtype=np.uint8)
+
+    def read(self):
+        frame = self.source
+        if self.scaled is not None:
+            pygame.transform.smoothscale(frame, self.size, self.scaled)
+            frame = self.scaled
+        if self.gray is not None:
+            pygame.transform.grayscale(frame, self.gray)
+            frame = self.gray
+
+        # (width, height, 3) view onto the surface memory; it locks the surface, so drop it
+        # before anything draws again
+        view = pygame.surfarray.pixels3d(frame)
+        if self.grayscale:
+            np.copyto(self.observation[:, :, 0], view[:, :, 0].T)
+        else:
+            np.copyto(self.observation, view.transpose(1, 0, 2))
+        del view
+        return self.observation
@@ -0,0 +1,142 @@
+import queue
+import threading
+import numpy as np
+import torch
+from replayBuffer import FIELDS
+
+
+class BatchPrefetcher:
+    """Samples replay batches on a background thread into preallocated torch tensors.
+
+    There are depth slots, each with staging tensors in the buffer's dtypes (pinned for a
+    CUDA device) and float32 / int64 tensors on the device. The thread gathers sampled
+    transitions straight into a free slot's staging tensors and copies them to the
+    device, on a side stream for CUDA; get() hands the learner the next ready slot.
+    Tensors from get() stay valid until the following get() call releases their slot.
+    Anything else touching the buffer (push, update_priorities) must hold self.lock.
+    """
+
+    def __init__(self, replay_buffer, batch_size, device, depth=2):
+        self.replay_buffer = replay_buffer
+        self.batch_size = batch_size
+        self.device = torch.device(device)
+        self.depth = depth
+        self.prioritized = hasattr(replay_buffer, "update_priorities")
+        self.beta = 0.4  # Importance-sampling exponent, read when a batch is sampled
+        self.lock = threading.Lock()
+
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+        self._current = None
+        self._error = None
+        self._thread = None
+
+    def _allocate(self):
+        # Called on the first get(), once the buffer has seen an observation
+        cuda = self.device.type == "cuda"
+        self._stream = torch.cuda.Stream(self.device) if cuda else None
+        for _ in range(self.depth):
+            staging = {}
+            for name in FIELDS:
+                shape, dtype = self.replay_buffer.spec(name)
+                dtype = torch.from_numpy(np.empty(0, dtype=dtype)).dtype
+                staging[name] = torch.empty((self.batch_size,) + tuple(shape), dtype=dtype, pin_memory=cuda)
+            staging["weights"] = torch.ones(self.batch_size, dtype=torch.float32, pin_memory=cuda)
+
+            out = {}
+            for name, tensor in staging.items():
+                dtype = torch.float32 if tensor.is_floating_point() or name.endswith("states") else tensor.dtype
+                if not cuda and dtype == tensor.dtype:
+                    out[name] = tensor  # Already usable as is on the CPU
+                else:
+                    out[name] = torch.empty(tensor.shape, dtype=dtype, device=self.device)
+
+            self._free.put({
+                "staging": staging,
+                "numpy": {name: tensor.numpy() for name, tensor in staging.items()},
+                "out": out,
+                "indices": None,
+                # copied: the device copy out of staging is done, released: the learner is done with out
+                "copied": torch.cuda.Event() if cuda else None,
+                "released": torch.cuda.Event() if cuda else None,
+            })
+
+    def _start(self):
+        self._allocate()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        buffer = self.replay_buffer
+        try:
+            while True:
+                slot = self._free.get()
+                if slot is None:
+                    return
+                if slot["copied"] is not None:
+                    slot["copied"].synchronize()
+
+                encoded = {}
+                with self.lock:
+                    if self.prioritized:
+                        indices, weights = buffer.sample_indices(self.batch_size, self.beta)
+                        np.copyto(slot["numpy"]["weights"], weights)
+                    else:
+                        indices = buffer.sample_indices(self.batch_size)
+                    for name in FIELDS:
+                        if buffer.encoded(name):
+                            encoded[name] = getattr(buffer, name)[indices]
+                        else:
+                            buffer.gather(name, indices, out=slot["numpy"][name])
+                    buffer.relabel(indices, slot["numpy"])
+                # Encoded frames were copied out (compact states) or are immutable (compressed
+                # bytes), so they are decoded outside the lock
+                for name, frames in encoded.items():
+                    buffer.decode(frames, out=slot["numpy"][name])
+                slot["indices"] = indices
+
+                if self._stream is not None:
+                    with torch.cuda.stream(self._stream):
+                        self._stream.wait_event(slot["released"])
+                        for name, tensor in slot["out"].items():
+                            tensor.copy_(slot["staging"][name], non_blocking=True)
+                        slot["copied"].record(self._stream)
+                else:
+                    for name, tensor in slot["out"].items():
+                        if tensor is not slot["staging"][name]:
+                            tensor.copy_(slot["staging"][name])
+                self._ready.put(slot)
+        except Exception as error:
+            self._error = error
+            self._ready.put(None)
+
+    def get(self):
+        """Next batch as (states, actions, rewards, next_states, dones, weights, indices).
+
+        weights are ones for a uniform buffer; indices is a NumPy array for
+        update_priorities.
+        """
+        if self._thread is None:
+            self._start()
+        if self._current is not None:
+            if self._current["released"] is not None:
+                self._current["released"].record(torch.cuda.current_stream(self.device))
+            self._free.put(self._current)
+            self._current = None
+
+        slot = self._ready.get()
+        if slot is None:
+            raise RuntimeError("Batch prefetch thread failed") from self._error
+        if slot["copied"] is not None:
+            torch.cuda.current_stream(self.device).wait_event(slot["copied"])
+        self._current = slot
+
+        out = slot["out"]
+        return (out["states"], out["actions"], out["rewards"], out["next_states"], out["dones"],
+                out["weights"], slot["indices"])
+
+    def close(self):
+        if self._thread is not None:
+            self._free.put(None)
+            self._thread.join()
+            self._thread = None
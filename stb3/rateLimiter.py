@@ -0,0 +1,45 @@
+import threading
+
+
+class ReplayRatioLimiter:
+    """Holds actors and learner to a target replay ratio, transitions sampled per transition inserted.
+
+    Actors call insert(n) after pushing n transitions and block while they are more than
+    tolerance sampled transitions ahead of the learner; the learner calls sample(n) before
+    training on a batch of n and blocks while it is more than tolerance ahead of the
+    actors, or until min_size transitions are in. With tolerance at least the batch size
+    the two sides can never block each other. Both return False once close() is called.
+    """
+
+    def __init__(self, replay_ratio, min_size, tolerance):
+        self.replay_ratio = replay_ratio
+        self.min_size = min_size
+        self.tolerance = tolerance
+        self.inserted = 0
+        self.sampled = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def _lead(self):
+        # How far the actors are ahead of the ratio, in sampled transitions
+        return self.replay_ratio * (self.inserted - self.min_size) - self.sampled
+
+    def insert(self, n):
+        with self._cond:
+            self.inserted += n
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self.closed or self._lead() <= self.tolerance)
+            return not self.closed
+
+    def sample(self, n):
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or (
+                self.inserted >= self.min_size and n - self._lead() <= self.tolerance))
+            self.sampled += n
+            self._cond.notify_all()
+            return not self.closed
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
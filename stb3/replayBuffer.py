@@ -0,0 +1,417 @@
+import os
+import threading
+import time
+import zlib
+import numpy as np
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Per-transition arrays, saved as <name>.npy when the buffer lives on disk
+FIELDS = ("states", "actions", "rewards", "next_states", "dones")
+FRAMES = ("states", "next_states")
+
+
+def frame_codec(name):
+    # (compress, decompress) for a compress= option
+    if name == "zlib":
+        return (lambda data: zlib.compress(data, 1)), zlib.decompress
+    if name == "lz4":
+        if lz4 is None:
+            raise ImportError("compress='lz4' needs the lz4 package, pip install lz4")
+        return lz4.frame.compress, lz4.frame.decompress
+    raise ValueError(f"Unknown frame compression {name!r}, expected 'zlib' or 'lz4'")
+
+
+class ReplayBuffer(object):
+    """Ring buffer of transitions held in preallocated NumPy arrays.
+
+    Arrays are allocated on the first push, when the observation shape and dtype are
+    known, so pixel frames are kept as uint8. push overwrites the oldest transition once
+    the buffer is full, sample draws a batch by index with replacement.
+
+    With a path the arrays are memory-mapped .npy files in that directory, next to a
+    header.npy holding (pos, size), so the buffer can outgrow RAM and a later run that
+    passes the same path and capacity picks up where it left off.
+
+    With compress ("zlib" or "lz4") states and next states are kept as compressed bytes,
+    and only the frames of a sampled batch are decompressed. A state equal to the
+    previous next state of the same batch row (the same env of a VecEnv) shares its
+    bytes, rows are tracked per pushing thread. stats() reports the memory saved and the
+    time spent decompressing.
+
+    With a renderer (frameRenderer.FrameRenderer) the pushed states are compact env states,
+    robotEnv.CustomEnv(obs_mode="compact"), and sampled batches come back as the frames the
+    renderer draws from them.
+    """
+
+    def __init__(self, capacity, path=None, compress=None, renderer=None):
+        if path is not None and compress is not None:
+            raise ValueError("Compressed frames are kept in memory, pass either path or compress")
+        if renderer is not None and compress is not None:
+            raise ValueError("Compact states are small already, pass either renderer or compress")
+        self.capacity = capacity
+        self.path = path
+        self.compress = compress
+        self.renderer = renderer
+        if compress is not None:
+            self._compress, self._decompress = frame_codec(compress)
+        self.pos = 0
+        self.size = 0
+        self.states = None
+        self.header = None
+        if path is not None and os.path.exists(os.path.join(path, "header.npy")):
+            self._load()
+
+    def _allocate(self, state):
+        state = np.asarray(state)
+        self.frame_shape, self.frame_dtype = state.shape, state.dtype
+        frame = ((self.capacity,), object) if self.compress else ((self.capacity,) + state.shape, state.dtype)
+        fields = {
+            "states": frame,
+            "actions": ((self.capacity,), np.int64),
+            "rewards": ((self.capacity,), np.float32),
+            "next_states": frame,
+            "dones": ((self.capacity,), np.float32),
+        }
+        # Compression bookkeeping: last next states by pushing thread and batch row, shared frames,
+        # time spent decompressing or rendering
+        self._last = {}
+        self.shared_frames = 0
+        self.decoded_frames = 0
+        self.decode_time = 0.0
+        if self.path is not None:
+            os.makedirs(self.path, exist_ok=True)
+        for name, (shape, dtype) in fields.items():
+            if self.path is None:
+                array = np.empty(shape, dtype=dtype)
+            else:
+                array = np.lib.format.open_memmap(os.path.join(self.path, name + ".npy"), mode="w+",
+                                                  dtype=dtype, shape=shape)
+            setattr(self, name, array)
+        # The header goes last, a buffer without one is never loaded
+        if self.path is not None:
+            self.header = np.lib.format.open_memmap(os.path.join(self.path, "header.npy"), mode="w+",
+                                                    dtype=np.int64, shape=(2,))
+
+    def _load(self):
+        for name in FIELDS:
+            setattr(self, name, np.lib.format.open_memmap(os.path.join(self.path, name + ".npy"), mode="r+"))
+        if len(self.states) != self.capacity:
+            raise ValueError(f"Replay buffer in {self.path} holds {len(self.states)} transitions, "
+                             f"not {self.capacity}")
+        self.header = np.lib.format.open_memmap(os.path.join(self.path, "header.npy"), mode="r+")
+        self.pos, self.size = int(self.header[0]), int(self.header[1])
+        self.frame_shape, self.frame_dtype = self.states.shape[1:], self.states.dtype
+        self.shared_frames = 0
+        self.decoded_frames = 0
+        self.decode_time = 0.0
+
+    def _write_header(self):
+        # After the transitions themselves, so the header never counts unwritten ones
+        if self.header is not None:
+            self.header[0] = self.pos
+            self.header[1] = self.size
+
+    def flush(self):
+        if self.header is not None:
+            for name in FIELDS:
+                getattr(self, name).flush()
+            self.header.flush()
+
+    def push(self, state, action, reward, next_state, done):
+        if self.states is None:
+            self._allocate(state)
+        # Copies into the slot, so callers may reuse their observation arrays
+        i = self.pos
+        if self.compress:
+            self._store_frames([i], [state], [next_state])
+        else:
+            self.states[i] = state
+            self.next_states[i] = next_state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.dones[i] = done
+        self.pos = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self._write_header()
+
+    def extend(self, states, actions, rewards, next_states, dones, infos=None):
+        # Push a batch of transitions at once, e.g. one per env of a VecEnv step. The step
+        # infos are only kept by HerReplayBuffer
+        if self.states is None:
+            self._allocate(states[0])
+        n = len(actions)
+        indices = (self.pos + np.arange(n)) % self.capacity
+        if self.compress:
+            self._store_frames(indices, states, next_states)
+        else:
+            self.states[indices] = states
+            self.next_states[indices] = next_states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.dones[indices] = dones
+        self.pos = (self.pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        self._write_header()
+
+    def _store_frames(self, indices, states, next_states):
+        # Each actor thread pushes its own envs' rows
+        last = self._last.get(threading.get_ident(), [])
+        self._last[threading.get_ident()] = current = []
+        for row, (i, state, next_state) in enumerate(zip(indices, states, next_states)):
+            # Usually this row's previous next state, unless its episode ended in between
+            if row < len(last) and np.array_equal(last[row][0], state):
+                self.states[i] = last[row][1]
+                self.shared_frames += 1
+            else:
+                self.states[i] = self._compress(np.ascontiguousarray(state).tobytes())
+            next_bytes = self._compress(np.ascontiguousarray(next_state).tobytes())
+            self.next_states[i] = next_bytes
+            current.append((np.array(next_state), next_bytes))
+
+    def spec(self, name):
+        # (shape, dtype) of one item of a field as gather() returns it
+        if name in FRAMES:
+            if self.renderer is not None:
+                return self.renderer.shape, np.dtype(np.uint8)
+            return self.frame_shape, self.frame_dtype
+        array = getattr(self, name)
+        return array.shape[1:], array.dtype
+
+    def encoded(self, name):
+        # Whether a field is stored in a form decode() has to turn into observations
+        return name in FRAMES and (self.compress is not None or self.renderer is not None)
+
+    def gather(self, name, indices, out=None):
+        # Items of one field at indices, into out if given
+        if self.encoded(name):
+            return self.decode(getattr(self, name)[indices], out)
+        return np.take(getattr(self, name), indices, axis=0, out=out, mode="clip")
+
+    def decode(self, frames, out=None):
+        # Decompress or render a sequence of stored frames into out, allocated if not given
+        start = time.perf_counter()
+        if self.renderer is not None:
+            out = self.renderer.render(frames, out)
+        else:
+            if out is None:
+                out = np.empty((len(frames),) + self.frame_shape, dtype=self.frame_dtype)
+            for row, data in enumerate(frames):
+                out[row] = np.frombuffer(self._decompress(data), dtype=self.frame_dtype).reshape(self.frame_shape)
+        self.decode_time += time.perf_counter() - start
+        self.decoded_frames += len(frames)
+        return out
+
+    def stats(self):
+        """Frame memory, raw against stored, and decode time per frame, for logging."""
+        shape, dtype = self.spec("states")
+        raw = 2 * self.size * int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if self.compress:
+            # Shared frames are one bytes object, count them once
+            unique = {id(data): len(data) for name in FRAMES for data in getattr(self, name)[:self.size]}
+            stored = sum(unique.values())
+        elif self.renderer is not None:
+            stored = 2 * self.size * int(np.prod(self.frame_shape)) * np.dtype(self.frame_dtype).itemsize
+        else:
+            stored = raw
+        return {
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "saved_bytes": raw - stored,
+            "ratio": raw / stored if stored else 1.0,
+            "shared_frames": self.shared_frames,
+            "decode_ms_per_frame": 1000 * self.decode_time / max(self.decoded_frames, 1),
+        }
+
+    def sample_indices(self, batch_size):
+        return np.random.randint(0, self.size, size=batch_size)
+
+    def relabel(self, indices, batch):
+        # Hook to rewrite a gathered batch (dict of FIELDS arrays) in place, see HerReplayBuffer
+        pass
+
+    def sample(self, batch_size):
+        indices = self.sample_indices(batch_size)
+        batch = {name: self.gather(name, indices) for name in FIELDS}
+        self.relabel(indices, batch)
+        return tuple(batch[name] for name in FIELDS)
+
+    def __len__(self):
+        return self.size
+
+
+class SumTree(object):
+    """Binary sum tree over a fixed number of leaves, stored in one flat array.
+
+    Node i has children 2i and 2i + 1, leaves start at self.leaf_start. Updates and
+    prefix-sum lookups walk one root-to-leaf path, O(log n), and both take whole
+    batches of indices at once.
+    """
+
+    def __init__(self, capacity):
+        self.leaf_start = 1
+        while self.leaf_start < capacity:
+            self.leaf_start *= 2
+        self.tree = np.zeros(2 * self.leaf_start, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices) + self.leaf_start
+        self.tree[nodes] = priorities
+        # Recompute the parents of every touched node, one level at a time
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        # Leaf index whose prefix-sum interval holds each value
+        nodes = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        while nodes[0] < self.leaf_start:
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = values >= left_sum
+            values -= np.where(go_right, left_sum, 0.0)
+            nodes = left + go_right
+        return nodes - self.leaf_start
+
+    def get(self, indices):
+        return self.tree[np.asarray(indices) + self.leaf_start]
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """ReplayBuffer that samples transitions in proportion to priority ** alpha.
+
+    New transitions get the highest priority seen so far. sample also returns
+    importance-sampling weights, normalised by the batch maximum, and the indices to
+    pass back to update_priorities with the batch's TD errors. Priorities are not saved
+    with a memory-mapped buffer, resumed transitions all start at the initial priority.
+    """
+
+    def __init__(self, capacity, alpha=0.6, epsilon=1e-6, path=None, compress=None, renderer=None):
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity)
+        super(PrioritizedReplayBuffer, self).__init__(capacity, path, compress, renderer)
+        if self.size:
+            self.tree.update(np.arange(self.size), self.max_priority ** self.alpha)
+
+    def push(self, state, action, reward, next_state, done):
+        index = self.pos
+        super(PrioritizedReplayBuffer, self).push(state, action, reward, next_state, done)
+        self.tree.update([index], self.max_priority ** self.alpha)
+
+    def extend(self, states, actions, rewards, next_states, dones, infos=None):
+        indices = (self.pos + np.arange(len(actions))) % self.capacity
+        super(PrioritizedReplayBuffer, self).extend(states, actions, rewards, next_states, dones, infos)
+        self.tree.update(indices, self.max_priority ** self.alpha)
+
+    def sample_indices(self, batch_size, beta=0.4):
+        # Stratified: one uniform draw from each of batch_size equal slices of the total
+        total = self.tree.total
+        values = (np.arange(batch_size) + np.random.uniform(size=batch_size)) * (total / batch_size)
+        indices = np.minimum(self.tree.find(np.minimum(values, np.nextafter(total, 0))), self.size - 1)
+
+        probabilities = self.tree.get(indices) / total
+        weights = (self.size * probabilities) ** (-beta)
+        weights = (weights / weights.max()).astype(np.float32)
+        return indices, weights
+
+    def sample(self, batch_size, beta=0.4):
+        indices, weights = self.sample_indices(batch_size, beta)
+        batch = {name: self.gather(name, indices) for name in FIELDS}
+        self.relabel(indices, batch)
+        return tuple(batch[name] for name in FIELDS) + (weights, indices)
+
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities ** self.alpha)
+
+
+class HerReplayBuffer(ReplayBuffer):
+    """ReplayBuffer that relabels sampled transitions with goals reached later in their episode.
+
+    States are flattened goal observations, gymnasium's FlattenObservation of
+    goalEnv.GoalRobotEnv, with the achieved and desired goals at the given slices. extend
+    also keeps the goal_info entries (name -> size) of each step info. relabel gives a
+    her_ratio share of a batch the achieved goal of a random later step of the same
+    episode (the "future" strategy) as desired goal, in state and next state, and
+    recomputes its reward with compute_reward(achieved_goal, desired_goal, info) and its done
+    with compute_done, which takes the same arguments. Other next-state entries, such as the
+    robot state, are left as recorded.
+
+    Transitions must arrive as whole steps of one VecEnv with n_envs envs, so the steps of
+    one env are n_envs apart in the buffer.
+    """
+
+    def __init__(self, capacity, n_envs, compute_reward, compute_done, goal_info, her_ratio=0.8,
+                 achieved=slice(0, 2), desired=slice(2, 4)):
+        super(HerReplayBuffer, self).__init__(capacity - capacity % n_envs)
+        self.n_envs = n_envs
+        self.compute_reward = compute_reward
+        self.compute_done = compute_done
+        self.goal_info = goal_info
+        self.her_ratio = her_ratio
+        self.achieved = achieved
+        self.desired = desired
+
+        # Episode id per transition and the last transition of each finished episode
+        self.episode = np.full(self.capacity, -1, dtype=np.int64)
+        self._episode_ids = np.arange(n_envs)
+        self._next_episode = n_envs
+        self._episode_end = {}
+
+    def _allocate(self, state):
+        super(HerReplayBuffer, self)._allocate(state)
+        self.infos = {name: np.empty((self.capacity, size)) for name, size in self.goal_info.items()}
+
+    def extend(self, states, actions, rewards, next_states, dones, infos=None):
+        indices = (self.pos + np.arange(len(actions))) % self.capacity
+        # An episode's last transition is the last of it to be overwritten, forget the episode then
+        for index, episode in zip(indices.tolist(), self.episode[indices].tolist()):
+            if self._episode_end.get(episode) == index:
+                del self._episode_end[episode]
+        super(HerReplayBuffer, self).extend(states, actions, rewards, next_states, dones)
+        for name, size in self.goal_info.items():
+            self.infos[name][indices] = np.array([info[name] for info in infos], dtype=np.float64).reshape(-1, size)
+
+        self.episode[indices] = self._episode_ids
+        for env_idx in np.flatnonzero(dones):
+            self._episode_end[self._episode_ids[env_idx]] = indices[env_idx]
+            self._episode_ids[env_idx] = self._next_episode
+            self._next_episode += 1
+
+    def relabel(self, indices, batch):
+        rows = np.flatnonzero(np.random.random(len(indices)) < self.her_ratio)
+        if len(rows) == 0:
+            return
+        start = indices[rows]
+
+        # Last step of each episode, the latest step of its env while it is still running
+        latest = (self.pos - self.n_envs + start % self.n_envs) % self.capacity
+        end = np.array([self._episode_end.get(episode, last) for episode, last in zip(self.episode[start], latest)])
+        steps = ((end - start) % self.capacity) // self.n_envs
+        future = (start + np.floor(np.random.random(len(rows)) * (steps + 1)).astype(np.int64) * self.n_envs) \
+            % self.capacity
+        # Skip steps whose episode has been partly overwritten
+        same = self.episode[future] == self.episode[start]
+        rows, start, future = rows[same], start[same], future[same]
+
+        goal = self.next_states[future][:, self.achieved]
+        batch["states"][rows, self.desired] = goal
+        batch["next_states"][rows, self.desired] = goal
+        info = {name: self.infos[name][start] for name in self.goal_info}
+        achieved = batch["states"][rows][:, self.achieved]
+        batch["rewards"][rows] = self.compute_reward(achieved, goal, info)
+        batch["dones"][rows] = self.compute_done(achieved, goal, info)
@@ -0,0 +1,64 @@
+import numpy as np
+from robotArm import ANGLE_STEP, TABLE_SIZE, COS_TABLE, SIN_TABLE
+from rewards import hypot
+
+# Robot states by table index, the index is picked + placed
+STATES = np.array([[0, 0], [1, 0], [1, 1]], dtype=np.int8)
+
+
+class RewardLookup:
+    """Distances and reward bands of robotEnv.CustomEnv.step, tabulated per pose.
+
+    Joint angles move in ANGLE_STEP increments, so a fixed apple and box leave
+    TABLE_SIZE x TABLE_SIZE poses times three robot states. Tables hold the distances
+    [angle1, angle2] and the index of the rewards.RewardBands band the arm falls in
+    [state, angle1, angle2], and are rebuilt only when the apple or box moves. What a band
+    does to the score is left to the bands themselves.
+    """
+
+    def __init__(self, bands, base_x, base_y, arm_length, object_radius):
+        cos = np.array(COS_TABLE)
+        sin = np.array(SIN_TABLE)
+        # End-effector position per pose, summed in the same order as RobotArm
+        end_x1 = base_x + arm_length * cos[:, None]
+        end_y1 = base_y - arm_length * sin[:, None]
+        self.end_x2 = end_x1 + arm_length * cos[None, :]
+        self.end_y2 = end_y1 - arm_length * sin[None, :]
+        self.bands = bands
+        self.object_radius = object_radius
+
+        self.apple_pos = None
+        self.box_pos = None
+        self.rebuilds = 0
+
+    @staticmethod
+    def covers(angle):
+        # Whether a joint angle has a row in the tables
+        return angle % ANGLE_STEP == 0
+
+    @staticmethod
+    def index(angle):
+        return int(angle // ANGLE_STEP) % TABLE_SIZE
+
+    @staticmethod
+    def state_index(state):
+        return state[0] + state[1]
+
+    def set_goals(self, apple_pos, box_pos):
+        apple_pos, box_pos = tuple(apple_pos), tuple(box_pos)
+        if apple_pos == self.apple_pos and box_pos == self.box_pos:
+            return
+        self.apple_pos, self.box_pos = apple_pos, box_pos
+        self.rebuilds += 1
+
+        self.distance_to_apple = hypot(apple_pos[0] - self.end_x2, apple_pos[1] - self.end_y2).astype(np.float64)
+        self.distance_to_box = hypot(box_pos[0] - self.end_x2, box_pos[1] - self.end_y2).astype(np.float64)
+
+        shape = (len(STATES), TABLE_SIZE, TABLE_SIZE)
+        distance_to_apple = np.broadcast_to(self.distance_to_apple, shape).ravel()
+        distance_to_box = np.broadcast_to(self.distance_to_box, shape).ravel()
+        state = np.repeat(STATES, TABLE_SIZE * TABLE_SIZE, axis=0)
+        self.band = self.bands.match_all(distance_to_apple, distance_to_box, state).reshape(shape)
+
+        # Nested-list copies for the per-step scalar lookups, indexing them beats NumPy scalars
+        self.rows = (self.band.tolist(), self.distance_to_apple.tolist(), self.distance_to_box.tolist())
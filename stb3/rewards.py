@@ -0,0 +1,167 @@
+import functools
+import math
+import numpy as np
+
+# math.hypot over arrays, so batched distances match the env's scalar ones to the last bit
+hypot = np.frompyfunc(math.hypot, 2, 1)
+
+# Rewards that depend on whether the pick / place tried in that band succeeds
+PICK, PLACE = "pick", "place"
+# Stands for the env's object_radius in band bounds
+RADIUS = "radius"
+
+# The reward of robotEnv.CustomEnv.step as distance bands, checked in order, the first match
+# wins and the score is kept when none does. Rows are (state, target, low, high, high_inclusive,
+# reward): state None matches any robot state, the distance from the end effector to target
+# ("apple" or "box") lies in (low, high], or (low, high) when high is exclusive. reward is a
+# number the score is set to, ("scale", k) for k * distance, ("add", k) for score + k, or
+# (PICK, reward) / (PLACE, reward): the band tries a pick / place, reward applies when it
+# succeeds and a failed one keeps the score.
+REWARD_BANDS = [
+    # Over an object: pick / place when the state allows it, penalised otherwise
+    ((0, 0), "apple", -math.inf, RADIUS, False, (PICK, ("add", 1000))),
+    (None, "apple", -math.inf, RADIUS, False, -300),
+    ((1, 0), "box", -math.inf, RADIUS, False, (PLACE, 100_000)),
+    (None, "box", -math.inf, RADIUS, False, -300),
+
+    # Robot state [0, 0]
+    ((0, 0), "apple", -math.inf, 5, True, 30),
+    ((0, 0), "apple", 5, 10, True, 20),
+    ((0, 0), "apple", 10, 15, True, 10),
+    ((0, 0), "box", -math.inf, 0, True, -500),
+    ((0, 0), "box", 5, 10, True, -400),
+    ((0, 0), "box", 10, 15, True, -300),
+    ((0, 0), "box", -math.inf, RADIUS, False, -700),
+
+    # Robot state [1, 0]
+    ((1, 0), "apple", -math.inf, RADIUS, False, -700),
+    ((1, 0), "apple", -math.inf, 5, True, -500),
+    ((1, 0), "apple", 5, 10, True, -400),
+    ((1, 0), "apple", 10, 15, True, -300),
+    ((1, 0), "box", -math.inf, 0, True, 30),
+    ((1, 0), "box", 5, 10, True, 20),
+    ((1, 0), "box", 10, 15, True, 10),
+
+    # Anywhere else, by the distance to the box
+    ((0, 0), "box", -math.inf, math.inf, True, ("scale", -1.5)),
+    ((1, 0), "box", -math.inf, math.inf, True, ("scale", -1.0)),
+]
+
+# How a band sets the score: to a constant, to a multiple of the distance, to score + a constant,
+# or leaves it
+SET, SCALE, ADD, KEEP = 0, 1, 2, 3
+TARGETS = {"apple": 0, "box": 1}
+OPERATIONS = {"scale": SCALE, "add": ADD}
+
+
+def tries(reward):
+    # Whether a band's reward hangs on a pick / place
+    return isinstance(reward, tuple) and reward[0] in (PICK, PLACE)
+
+
+def compile_reward(reward):
+    # (how, value) of a plain reward: a number, ("scale", k) or ("add", k)
+    if isinstance(reward, tuple):
+        return OPERATIONS[reward[0]], reward[1]
+    return SET, reward
+
+
+class RewardBands:
+    """A band table compiled for evaluation, over whole batches of arms or one arm at a time.
+
+    Bands become parallel arrays: state code (picked * 2 + placed, -1 for any), target,
+    bounds and, per band and pick / place outcome, how the score is set and with what.
+    """
+
+    def __init__(self, bands=REWARD_BANDS, object_radius=20):
+        self.bands = list(bands)
+        n = len(self.bands)
+        self.state = np.array([-1 if state is None else 2 * state[0] + state[1] for state, *_ in self.bands])
+        self.target = np.array([TARGETS[target] for _, target, *_ in self.bands])
+        bound = lambda value: object_radius if value == RADIUS else value
+        self.low = np.array([bound(low) for _, _, low, *_ in self.bands], dtype=np.float64)
+        self.high = np.array([bound(high) for _, _, _, high, _, _ in self.bands], dtype=np.float64)
+        self.high_inclusive = np.array([inclusive for *_, inclusive, _ in self.bands])
+        self.kinds = [reward[0] if tries(reward) else None for *_, reward in self.bands] + [None]
+        self.kind_code = np.array([{PICK: 1, PLACE: 2}.get(kind, 0) for kind in self.kinds])
+
+        # Row n is "no band matched"; column 1 is the outcome when the band's pick / place succeeds
+        self.how = np.full((n + 1, 2), KEEP, dtype=np.int8)
+        self.value = np.zeros((n + 1, 2), dtype=np.float64)
+        for i, (*_, reward) in enumerate(self.bands):
+            if tries(reward):
+                self.how[i, 1], self.value[i, 1] = compile_reward(reward[1])
+            else:
+                self.how[i], self.value[i] = compile_reward(reward)
+
+        # Plain Python rows for the one-arm path
+        self.rows = list(zip(self.state.tolist(), self.target.tolist(), self.low.tolist(), self.high.tolist(),
+                             self.high_inclusive.tolist()))
+        self.how_rows = self.how.tolist()
+        self.value_rows = self.value.tolist()
+
+    def match(self, distance_to_apple, distance_to_box, state):
+        # Index of the first band one arm falls in, len(bands) if none
+        code = 2 * state[0] + state[1]
+        distances = (distance_to_apple, distance_to_box)
+        for i, (band_state, target, low, high, high_inclusive) in enumerate(self.rows):
+            if band_state >= 0 and band_state != code:
+                continue
+            distance = distances[target]
+            if distance > low and (distance <= high if high_inclusive else distance < high):
+                return i
+        return len(self.rows)
+
+    def kind(self, band):
+        # PICK or PLACE when the band's reward depends on a pick / place, else None
+        return self.kinds[band]
+
+    def apply(self, band, score, distance_to_apple, distance_to_box, success=False):
+        # New score of one arm that matched band
+        how, value = self.how_rows[band][success], self.value_rows[band][success]
+        if how == SET:
+            return value
+        if how == SCALE:
+            return value * (distance_to_apple if self.rows[band][1] == 0 else distance_to_box)
+        if how == ADD:
+            return score + value
+        return score
+
+    def match_all(self, distance_to_apple, distance_to_box, state):
+        # match over a batch of arms, state is (N, 2)
+        state = np.asarray(state)
+        code = 2 * state[:, 0].astype(np.int64) + state[:, 1]
+        distances = (np.asarray(distance_to_apple, dtype=np.float64), np.asarray(distance_to_box, dtype=np.float64))
+
+        # Walk the bands last to first, so the first match is the one left standing
+        band = np.full(len(code), len(self.rows), dtype=np.int64)
+        for i in reversed(range(len(self.rows))):
+            band_state, target, low, high, high_inclusive = self.rows[i]
+            distance = distances[target]
+            inside = (distance > low) & ((distance <= high) if high_inclusive else (distance < high))
+            if band_state >= 0:
+                inside &= code == band_state
+            band[inside] = i
+        return band
+
+    def __call__(self, score, distance_to_apple, distance_to_box, state, picked=False, placed=False):
+        """New scores for a batch of arms; state is (N, 2), picked / placed say whether the pick /
+        place of a PICK / PLACE band succeeded."""
+        score = np.asarray(score, dtype=np.float64)
+        distance_to_apple = np.asarray(distance_to_apple, dtype=np.float64)
+        distance_to_box = np.asarray(distance_to_box, dtype=np.float64)
+        band = self.match_all(distance_to_apple, distance_to_box, state)
+
+        kind = self.kind_code[band]
+        success = (((kind == 1) & np.asarray(picked)) | ((kind == 2) & np.asarray(placed))).astype(np.int64)
+        how, value = self.how[band, success], self.value[band, success]
+        target = np.append(self.target, 0)[band]
+        distance = np.where(target == 0, distance_to_apple, distance_to_box)
+        return np.select([how == SET, how == SCALE, how == ADD], [value, value * distance, score + value],
+                         default=score)
+
+
+@functools.lru_cache(maxsize=None)
+def reward_bands(object_radius=20):
+    # REWARD_BANDS compiled for an object radius, shared by every caller
+    return RewardBands(REWARD_BANDS, object_radius)
@@ -0,0 +1,95 @@
+import math
+import pygame
+
+# Actions turn the joints in 5 degree steps, so from reset every joint angle is a multiple
+# of ANGLE_STEP and its trig comes from these tables
+ANGLE_STEP = 5
+TABLE_SIZE = 360 // ANGLE_STEP
+COS_TABLE = [math.cos(math.radians(i * ANGLE_STEP)) for i in range(TABLE_SIZE)]
+SIN_TABLE = [math.sin(math.radians(i * ANGLE_STEP)) for i in range(TABLE_SIZE)]
+
+
+def cos_sin(angle):
+    # Table lookup for quantized angles, plain math for anything in between
+    if angle % ANGLE_STEP == 0:
+        index = int(angle // ANGLE_STEP) % TABLE_SIZE
+        return COS_TABLE[index], SIN_TABLE[index]
+    radians = math.radians(angle)
+    return math.cos(radians), math.sin(radians)
+
+
+class RobotArm:
+    def __init__(self, base_x, base_y, arm_length, screen, BLACK, RED, GREEN, BLUE):
+        self.base_x = base_x
+        self.base_y = base_y
+        self.arm_length = arm_length
+        self.angle1 = 0
+        self.angle2 = 0
+        self.holding = None
+        self.screen = screen  # Store the screen object
+        self.BLACK = BLACK
+        self.RED = RED
+        self.GREEN = GREEN
+        self.BLUE = BLUE
+
+        # Forward kinematics of the last pose asked for, shared by reward logic and drawing
+        self._cached_angles = None
+        self._joint_trig = None
+        self._kinematics = None
+
+    def update(self, angle1_change, angle2_change):
+        self.angle1 += angle1_change
+        self.angle2 += angle2_change
+
+    def _refresh(self):
+        angles = (self.angle1, self.angle2)
+        if angles != self._cached_angles:
+            cos1, sin1 = cos_sin(self.angle1)
+            cos2, sin2 = cos_sin(self.angle2)
+            end_x1 = self.base_x + self.arm_length * cos1
+            end_y1 = self.base_y - self.arm_length * sin1
+            end_x2 = end_x1 + self.arm_length * cos2
+            end_y2 = end_y1 - self.arm_length * sin2
+            self._cached_angles = angles
+            self._joint_trig = (cos1, sin1, cos2, sin2)
+            self._kinematics = (end_x1, end_y1, end_x2, end_y2)
+
+    def joint_trig(self):
+        # (cos1, sin1, cos2, sin2) of the current joint angles
+        self._refresh()
+        return self._joint_trig
+
+    def kinematics(self):
+        # Elbow and end-effector positions (end_x1, end_y1, end_x2, end_y2)
+        self._refresh()
+        return self._kinematics
+
+    def end_effector(self):
+        self._refresh()
+        return self._kinematics[2], self._kinematics[3]
+
+    def draw(self):  # Remove screen argument
+        end_x1, end_y1, end_x2, end_y2 = self.kinematics()
+        pygame.draw.line(self.screen, self.BLACK, (self.base_x, self.base_y), (end_x1, end_y1), 5)
+        pygame.draw.line(self.screen, self.BLACK, (end_x1, end_y1), (end_x2, end_y2), 5)
+        pygame.draw.circle(self.screen, self.RED, (int(end_x2), int(end_y2)), 10)
+        if self.holding:
+            pygame.draw.circle(self.screen, self.GREEN, (int(end_x2), int(end_y2)), 15)
+
+    def pick(self, object_pos, object_radius):
+        end_x2, end_y2 = self.end_effector()
+        distance = math.hypot(object_pos[0] - end_x2, object_pos[1] - end_y2)
+        if distance < object_radius:
+            self.holding = object_pos
+            return True
+        else:
+            return False
+
+    def place(self, target_pos, target_radius):
+        if self.holding:
+            end_x2, end_y2 = self.end_effector()
+            distance = math.hypot(target_pos[0] - end_x2, target_pos[1] - end_y2)
+            if distance < target_radius:
+                self.holding = None
+                return True
+        return False
@@ -3,21 +3,35 @@ from gymnasium import spaces
 import numpy as np
 import pygame
 import math
-import random
-import time
+from simClock import SimClock
+from pixelObs import PixelObservation
+from hud import Hud
+from stepTiming import StepTimer
+from robotArm import RobotArm
+from rewardLookup import RewardLookup
+import rewards
+import tracing
+
+# Everything a frame is drawn from, in the order of a "compact" observation. Distances are -1
+# before the first step measures them and timer_steps is -1 while the timer is stopped
+COMPACT_FIELDS = ("angle1", "angle2", "holding", "apple_x", "apple_y", "box_x", "box_y", "state0", "state1",
+                  "score", "timer_state", "distance_to_apple", "distance_to_box", "timer_steps")
 
 class CustomEnv(gym.Env):
     """Custom Environment that follows gym interface."""
 
-    metadata = {"render_modes": ["human"], "render_fps": 30}
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 30}
 
-    def __init__(self, screen):
+    def __init__(self, screen=None, render_mode=None, obs_mode="pixels", obs_size=None, grayscale=False,
+                 crop_workspace=False, hud=True, reward_table=False, step_timing=False, timing_dir=None):
         super().__init__()
         # Constants
         self.WIDTH, self.HEIGHT = 800, 600
         self.FPS = 60
         self.TIMER_LIMIT = 15  # Timer limit in seconds
         self.TIMER_STATE = 0
+        self.ARM_LENGTH = 100
+        self.object_radius = 20
 
         # Colors
         self.WHITE = (255, 255, 255)
@@ -30,27 +44,82 @@ class CustomEnv(gym.Env):
         # self.action_space = spaces.Discrete(4)  # 4 discrete actions
         self.action_space = spaces.Discrete(5)  # 0: Do nothing, 1: Pick, 2: Place, 3: Rotate arm 1, 4: Rotate arm 2
 
-        self.observation_space = spaces.Box(low=0, high=255, shape=(self.HEIGHT, self.WIDTH, 3), dtype=np.uint8)
+        # A screen handed in by the caller is a display surface, keep presenting to it
+        if screen is not None and render_mode is None:
+            render_mode = "human"
+        self.render_mode = render_mode
+
+        self.screen = screen if screen is not None else self._create_screen()
+
+        # "pixels": the rendered frame, "vector": a small float32 state vector (see _get_vector_observation),
+        # "compact": the values the frame is drawn from (COMPACT_FIELDS), for redrawing it later with
+        # frameRenderer.FrameRenderer
+        if obs_mode == "pixels":
+            # Optionally cropped to the square the arm can reach around its base, resized to obs_size
+            # (width, height) and converted to grayscale
+            crop = None
+            if crop_workspace:
+                reach = 2 * self.ARM_LENGTH + self.object_radius
+                crop = pygame.Rect(self.WIDTH // 2 - reach, self.HEIGHT // 2 - reach, 2 * reach, 2 * reach)
+                crop = crop.clip(self.screen.get_rect())
+            self.pixels = PixelObservation(self.screen, size=obs_size, grayscale=grayscale, crop=crop)
+            self.observation_space = spaces.Box(low=0, high=255, shape=self.pixels.shape, dtype=np.uint8)
+        elif obs_mode == "vector":
+            self.pixels = None
+            self.observation_space = spaces.Box(low=-1.0, high=1.0, shape=(14,), dtype=np.float32)
+        elif obs_mode == "compact":
+            self.pixels = None
+            self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(len(COMPACT_FIELDS),),
+                                                dtype=np.float64)
+        else:
+            raise ValueError("Only pixels, vector and compact observation modes are supported.")
+        self.obs_mode = obs_mode
+        self.DIAGONAL = math.hypot(self.WIDTH, self.HEIGHT)
+        # Vector and compact observations only need a frame when a human is watching
+        self.draw_frames = obs_mode == "pixels" or self.render_mode == "human"
+        # The debug text can be dropped for training, it costs more to draw than the arm
+        self.show_hud = hud
+        self.hud = None
+        self.reward_bands = rewards.reward_bands(self.object_radius)
+        # Opt-in: read distances and reward bands from per-pose tables instead of measuring them
+        self.reward_table = RewardLookup(self.reward_bands, self.WIDTH // 2, self.HEIGHT // 2, self.ARM_LENGTH,
+                                         self.object_radius) if reward_table else None
+        # Opt-in: per-phase timings of step() and reset() in info, histograms dumped to timing_dir
+        # at the end of each episode
+        self.step_timer = StepTimer(timing_dir) if step_timing else None
 
-        self.screen = screen
         self.clock = None
         self.robot_arm = None
         self.apple_pos = None
         self.box_pos = None
-        self.object_radius = 20
         self.score = 0
         self.running = True
         self.timer_start = None  # Variable to store timer start time
+        self.timer_penalty = 0  # Taken off the score by the timer during the last step
 
         # Robot state
         self.state = [0, 0]
 
+    def _create_screen(self):
+        if self.render_mode == "human":
+            pygame.display.init()
+            return pygame.display.set_mode((self.WIDTH, self.HEIGHT))
+        # Offscreen: draw into an in-memory surface, the display module is never touched
+        return pygame.Surface((self.WIDTH, self.HEIGHT))
+
+    def _init_pygame(self):
+        if self.render_mode == "human":
+            pygame.init()
+        else:
+            pygame.font.init()  # Only the HUD text needs a pygame module
+
     def generate_apple_position(self):
         min_x = max(self.robot_arm.base_x - self.robot_arm.arm_length, 0)
         max_x = min(self.robot_arm.base_x + self.robot_arm.arm_length, self.WIDTH)
         min_y = max(self.robot_arm.base_y - self.robot_arm.arm_length, 0)
         max_y = min(self.robot_arm.base_y + self.robot_arm.arm_length, self.HEIGHT)
-        return (random.randint(min_x, max_x), random.randint(min_y, max_y))
+        # Drawn from the env's seeded generator, so each seeded worker gets its own apple sequence
+        return (int(self.np_random.integers(min_x, max_x + 1)), int(self.np_random.integers(min_y, max_y + 1)))
 
     def handle_events(self):
         for event in pygame.event.get():
@@ -80,56 +149,49 @@ class CustomEnv(gym.Env):
         pygame.draw.rect(self.screen, self.BLACK, (self.box_pos[0] - self.object_radius, self.box_pos[1] - self.object_radius, self.object_radius * 2, self.object_radius * 2))
         self.robot_arm.draw()
         
-        font = pygame.font.Font(None, 36)
-        score_text = font.render(f"Score: {self.score:.2f}", True, self.BLACK)
-        self.screen.blit(score_text, (10, 10))
-
-        # Additional debugging information
-        angle_text = font.render(f"Arm Angles: {self.robot_arm.angle1:.2f}, {self.robot_arm.angle2:.2f}", True, self.BLACK)
-        self.screen.blit(angle_text, (10, 40))
+        if self.hud is not None:
+            self.draw_hud()
 
-        holding_text = font.render(f"Holding: {'Yes' if self.robot_arm.holding else 'No'}", True, self.BLACK)
-        self.screen.blit(holding_text, (10, 130))
+        if self.render_mode == "human":
+            pygame.display.flip()
 
-        robot_state_text = font.render(f"Robot State: {self.state}", True, self.BLACK)
-        self.screen.blit(robot_state_text, (10, 160))
+    def draw_hud(self):
+        hud = self.hud
+        hud.text("Score: ", f"{self.score:.2f}", self.BLACK, (10, 10))
 
-        if self.state == [1, 1]:
-            game_state_text = font.render(f"Game State: W", True, self.RED)
-            self.screen.blit(game_state_text, (self.WIDTH - 180, 70))
-        else:
-            game_state_text = font.render(f"Game State: R", True, self.RED)
-            self.screen.blit(game_state_text, (self.WIDTH -180, 70))
-
-        timmer_state_text = font.render(f"Timmer State: {self.TIMER_STATE}", True, self.RED)
-        self.screen.blit(timmer_state_text, (self.WIDTH -190, 40))
+        # Additional debugging information
+        hud.text("Arm Angles: ", f"{self.robot_arm.angle1:.2f}, {self.robot_arm.angle2:.2f}", self.BLACK, (10, 40))
+        hud.text("Holding: ", 'Yes' if self.robot_arm.holding else 'No', self.BLACK, (10, 130))
+        hud.text("Robot State: ", f"{self.state}", self.BLACK, (10, 160))
+        hud.text("Game State: ", "W" if self.state == [1, 1] else "R", self.RED, (self.WIDTH - 180, 70))
+        hud.text("Timmer State: ", f"{self.TIMER_STATE}", self.RED, (self.WIDTH - 190, 40))
 
-        # Display distance to apple
+        # Display distances to apple and box
         if hasattr(self, 'distance_to_apple'):
-            distance_text = font.render(f"Distance Apple: {self.distance_to_apple:.2f}", True, self.RED)
-            self.screen.blit(distance_text, (10, 70))  # Position below the score
-        # Display distance to apple
-
+            hud.text("Distance Apple: ", f"{self.distance_to_apple:.2f}", self.RED, (10, 70))
         if hasattr(self, 'distance_to_box'):
-            distance_text_box = font.render(f"Distance Box: {self.distance_to_box:.2f}", True, self.RED)
-            self.screen.blit(distance_text_box, (10, 100))  # Position below the score
+            hud.text("Distance Box: ", f"{self.distance_to_box:.2f}", self.RED, (10, 100))
 
         if self.timer_start is not None:
-            elapsed_time = time.time() - self.timer_start
-            if elapsed_time >= self.TIMER_LIMIT:
-                self.score -= 500
-                self.timer_start = None
-                self.TIMER_STATE += 1
-                if self.TIMER_STATE > 4:
-                    self.score -= 2000
-                    self.state = [0, 0]
-                    self.robot_arm.holding = None
-                    self.TIMER_STATE = 0
-            else:
-                timer_text = font.render(f"Time left: {self.TIMER_LIMIT - int(elapsed_time)}s", True, self.RED)
-                self.screen.blit(timer_text, (self.WIDTH - 160, 10))
-        
-        pygame.display.flip()
+            elapsed_time = self.clock.elapsed(self.timer_start)
+            if elapsed_time < self.TIMER_LIMIT:
+                hud.text("Time left: ", f"{self.TIMER_LIMIT - int(elapsed_time)}s", self.RED, (self.WIDTH - 160, 10))
+
+    def update_timer(self):
+        # The timer runs on simulated seconds, so penalties do not depend on how fast the host steps
+        if self.timer_start is None:
+            return
+        if self.clock.elapsed(self.timer_start) >= self.TIMER_LIMIT:
+            self.score -= 500
+            self.timer_penalty -= 500
+            self.timer_start = None
+            self.TIMER_STATE += 1
+            if self.TIMER_STATE > 4:
+                self.score -= 2000
+                self.timer_penalty -= 2000
+                self.state = [0, 0]
+                self.robot_arm.holding = None
+                self.TIMER_STATE = 0
 
 
     # def check_game_over(self):
@@ -137,21 +199,27 @@ class CustomEnv(gym.Env):
     #         self.running = False
     def check_game_over(self):
         if self.score >= 10_000 or self.score <= -1000:
-            print("Game Over condition met.")
+            tracing.event("game_over", score=self.score)
             self.running = False
         if self.TIMER_STATE >= 4:
             self.running = False
         if self.state == [1, 1]:
-            print("Both actions completed")
+            tracing.event("task_completed", score=self.score)
             self.running = False  # Or any other action you'd like to take
             # self.reset() 
         
 
 
-    def reset(self, seed=None):
-        pygame.init()
-        self.clock = pygame.time.Clock()
-        self.robot_arm = RobotArm(self.WIDTH // 2, self.HEIGHT // 2, 100, self.screen, self.BLACK, self.RED, self.GREEN, self.BLUE)  # Pass colors to RobotArm constructor
+    def reset(self, seed=None, options=None):
+        timer = self.step_timer
+        if timer is not None:
+            timer.begin()
+        super().reset(seed=seed)
+        self._init_pygame()
+        if self.show_hud and self.hud is None:
+            self.hud = Hud(self.screen)
+        self.clock = SimClock(self.FPS, realtime=self.render_mode == "human")
+        self.robot_arm = RobotArm(self.WIDTH // 2, self.HEIGHT // 2, self.ARM_LENGTH, self.screen, self.BLACK, self.RED, self.GREEN, self.BLUE)  # Pass colors to RobotArm constructor
         # self.apple_pos = self.generate_apple_position()
         self.apple_pos = (250, 300)
         self.box_pos = (3 * self.WIDTH // 4, self.HEIGHT // 2)
@@ -160,32 +228,73 @@ class CustomEnv(gym.Env):
         self.timer_start = None
         self.state = [0, 0]
         self.TIMER_STATE = 0
-        return self._get_observation(), {}
+        if timer is not None:
+            timer.lap("reset_state")
+        if self.draw_frames:
+            self.draw()
+        if timer is None:
+            return self._get_observation(), {}
+        timer.lap("reset_draw")
+        observation = self._get_observation()
+        timer.lap("reset_observation")
+        return observation, {"timing_ns": timer.end("reset")}
 
     def _get_observation(self):
-        # Create an observation array with dimensions (HEIGHT, WIDTH, 3)
-        observation = np.zeros((self.HEIGHT, self.WIDTH, 3), dtype=np.uint8)
-        
-        # Draw the environment onto the observation array
-        self.draw()
-        
-        # Convert the observation array to a Pygame surface
-        surface = pygame.surfarray.make_surface(observation)
-        
-        # Check if the dimensions match before blitting the array
-        if surface.get_size() == self.screen.get_size():
-            pygame.surfarray.blit_array(surface, observation)
-            return observation.transpose(1, 0, 2)  # Transpose to match the expected shape
+        # Reads the frame drawn last, the pixel array is reused on the next call
+        if self.obs_mode == "vector":
+            return self._get_vector_observation()
+        if self.obs_mode == "compact":
+            return self.get_compact_state()
+        return self.pixels.read()
+
+    def get_compact_state(self):
+        timer_steps = -1 if self.timer_start is None else self.clock.steps - self.timer_start
+        return np.array([
+            self.robot_arm.angle1, self.robot_arm.angle2, bool(self.robot_arm.holding),
+            self.apple_pos[0], self.apple_pos[1], self.box_pos[0], self.box_pos[1],
+            self.state[0], self.state[1], self.score, self.TIMER_STATE,
+            getattr(self, "distance_to_apple", -1), getattr(self, "distance_to_box", -1), timer_steps,
+        ], dtype=np.float64)
+
+    def set_compact_state(self, values):
+        # Restores what draw() reads from a compact observation; dynamics state such as the clock
+        # is only approximated, enough to draw the same frame
+        (angle1, angle2, holding, apple_x, apple_y, box_x, box_y, state0, state1, score, timer_state,
+         distance_to_apple, distance_to_box, timer_steps) = values.tolist()
+        self.robot_arm.angle1, self.robot_arm.angle2 = angle1, angle2
+        self.apple_pos = (int(apple_x), int(apple_y))
+        self.box_pos = (int(box_x), int(box_y))
+        self.robot_arm.holding = self.apple_pos if holding else None
+        self.state = [int(state0), int(state1)]
+        self.score = score
+        self.TIMER_STATE = int(timer_state)
+        for name, distance in (("distance_to_apple", distance_to_apple), ("distance_to_box", distance_to_box)):
+            if distance < 0:
+                self.__dict__.pop(name, None)
+            else:
+                setattr(self, name, distance)
+        if timer_steps < 0:
+            self.timer_start = None
         else:
-            # Create a resized surface to match self.screen dimensions
-            resized_surface = pygame.transform.scale(surface, self.screen.get_size())
-            
-            # Convert the resized surface back to a NumPy array
-            resized_observation = pygame.surfarray.array3d(resized_surface)
-            return resized_observation.transpose(1, 0, 2)  # Transpose to match the expected shape
-
-
-
+            self.clock.steps = int(timer_steps)
+            self.timer_start = 0
+
+    def _get_vector_observation(self):
+        # Cached forward kinematics of the current arm pose, the trig terms double as angle features
+        cos1, sin1, cos2, sin2 = self.robot_arm.joint_trig()
+        end_x2, end_y2 = self.robot_arm.end_effector()
+        distance_to_apple = math.hypot(self.apple_pos[0] - end_x2, self.apple_pos[1] - end_y2)
+        distance_to_box = math.hypot(self.box_pos[0] - end_x2, self.box_pos[1] - end_y2)
+
+        # Positions are scaled by the screen size and distances by its diagonal
+        return np.array([
+            sin1, cos1, sin2, cos2,
+            end_x2 / self.WIDTH, end_y2 / self.HEIGHT,
+            self.apple_pos[0] / self.WIDTH, self.apple_pos[1] / self.HEIGHT,
+            self.box_pos[0] / self.WIDTH, self.box_pos[1] / self.HEIGHT,
+            distance_to_apple / self.DIAGONAL, distance_to_box / self.DIAGONAL,
+            self.state[0], self.state[1],
+        ], dtype=np.float32)
 
     # def step(self, action):
     #     angle1_change = 0
@@ -240,16 +349,6 @@ class CustomEnv(gym.Env):
         angle1_change = 0
         angle2_change = 0
 
-        # Calculate distance to apple and store it as an attribute
-        end_x2 = self.robot_arm.base_x + self.robot_arm.arm_length * math.cos(math.radians(self.robot_arm.angle1)) + \
-                self.robot_arm.arm_length * math.cos(math.radians(self.robot_arm.angle2))
-        end_y2 = self.robot_arm.base_y - self.robot_arm.arm_length * math.sin(math.radians(self.robot_arm.angle1)) - \
-                self.robot_arm.arm_length * math.sin(math.radians(self.robot_arm.angle2))
-        
-        self.distance_to_apple = math.sqrt((self.apple_pos[0] - end_x2) ** 2 + (self.apple_pos[1] - end_y2) ** 2)
-
-        self.distance_to_box = math.sqrt((self.box_pos[0] - end_x2) ** 2 + (self.box_pos[1] - end_y2) ** 2)
-
         # Define action mappings
         if action == 0:
             angle1_change = -5
@@ -259,176 +358,145 @@ class CustomEnv(gym.Env):
             angle2_change = 5
         elif action == 3:
             angle2_change = -5
-        
-
-        # Check if gripper passes over the target (apple)
-        # Update robot arm angles based on action
-        self.update(angle1_change, angle2_change)
-        
-        # Reward logic
-        if self.distance_to_apple < self.object_radius:  # Gripper passes over the apple
-            if self.state == [0,0]:
-                if self.robot_arm.pick(self.apple_pos, self.object_radius):
-                    self.score += 1000  # Reward for passing over the target
-                    print(f"Score after passing over apple: {self.score}") 
-                    self.state[0] = 1  # Indicating the apple has been picked
-                    self.state[1] = 0  # Indicating the apple has been placed
-                    self.apple_pos = self.generate_apple_position()  # Generate a new apple position
-                # self.timer_start = None  # Reset timer
-            else:
-                self.score = -300
-
-        elif self.distance_to_box < self.object_radius:
-            if self.state == [1,0]:
-                if self.robot_arm.place(self.box_pos, self.object_radius):
-                    print(f"Score after passing over box: {self.score}")
-                    self.score = 100_000
-                    # self.state == [1,1]
-                    self.state[0] = 1  # Indicating the apple has been picked
-                    self.state[1] = 1  # Indicating the apple has been placed
-                    self.apple_pos = self.generate_apple_position()
-            # if self.state == [0,0]:
-            #     self.score = -20
-            else:
-                self.score = -300
 
-        # Robot state [0, 0]
-        elif self.distance_to_apple <= 5 and self.state == [0, 0]:
-            self.score = 30
-        elif (self.distance_to_apple > 5 and self.distance_to_apple <= 10) and self.state == [0, 0]:
-            self.score = 20
-        elif (self.distance_to_apple > 10 and self.distance_to_apple <= 15) and self.state == [0, 0]:
-            self.score = 10
+        # With step_timing each phase is lapped, the kinematics of the first update inside the reward
+        timer = self.step_timer
+        if timer is not None:
+            timer.begin()
 
-        
-        elif self.distance_to_box <= 0 and self.state == [0, 0]:
-            self.score = -500
-        elif (self.distance_to_box > 5 and self.distance_to_box <= 10) and self.state == [0, 0]:
-            self.score = -400
-        elif (self.distance_to_box > 10 and self.distance_to_box <= 15) and self.state == [0, 0]:
-            self.score = -300
-        elif (self.distance_to_box < self.object_radius) and self.state == [0, 0]:
-            self.score = -700
-
-        # Robot state [1,0]
-        elif (self.distance_to_apple < self.object_radius) and self.state == [1, 0]:
-            self.score = -700
-        elif self.distance_to_apple <= 5 and self.state == [1, 0]:
-            self.score = -500
-        elif (self.distance_to_apple > 5 and self.distance_to_apple <= 10) and self.state == [1, 0]:
-            self.score = -400
-        elif (self.distance_to_apple > 10 and self.distance_to_apple <= 15) and self.state == [1, 0]:
-            self.score = -300
-        
-        elif self.distance_to_box <= 0 and self.state == [1, 0]:
-            self.score = 30
-        elif (self.distance_to_box > 5 and self.distance_to_box <= 10) and self.state == [1, 0]:
-            self.score = 20
-        elif (self.distance_to_box > 10 and self.distance_to_box <= 15) and self.state == [1, 0]:
-            self.score = 10
-
-        # elif self.state == [0, 0]:
-        #     self.score = (-1 * self.distance_to_apple)*10
-        #     self.score = (-1 * self.distance_to_box)
-
-        elif self.state == [0, 0] :
-            self.score = (-1 * self.distance_to_apple)
-            self.score = (-1 * self.distance_to_box)*1.5
-    
-        elif self.state == [1, 0] :
-            self.score = (-1 * self.distance_to_apple)*1.5
-            self.score = (-1 * self.distance_to_box)
+        # Reward logic, moves the arm by the first update
+        self.timer_penalty = 0
+        if self.reward_table is not None:
+            self.lookup_reward(angle1_change, angle2_change)
+        else:
+            self.band_reward(angle1_change, angle2_change)
+        if timer is not None:
+            timer.lap("reward")
 
         # Update robot arm angles based on action
         self.update(angle1_change, angle2_change)
+        if timer is not None:
+            timer.lap("update")
 
         # Handle events and check game over state
         self.check_game_over()
-        
 
-        # Draw the environment
-        self.draw()
+        # Timer penalties
+        self.update_timer()
+        if timer is not None:
+            timer.lap("game_over")
 
-        # Clock tick
-        self.clock.tick(self.FPS)
+        # Clock tick, paced to FPS only when rendering for a human
+        self.clock.tick()
 
         # Start timer if not already started
         if self.timer_start is None:
-            self.timer_start = time.time()
+            self.timer_start = self.clock.steps
+        if timer is not None:
+            timer.lap("clock")
 
+        # Draw the environment once, the observation is read from this frame
+        if self.draw_frames:
+            self.draw()
+        if timer is not None:
+            timer.lap("draw")
+
+        observation = self._get_observation()
+        if not self.running and self.obs_mode == "pixels":
+            # Vec envs keep the terminal observation across the reset that reuses the pixel array
+            observation = observation.copy()
+        if timer is None:
+            # Return observation, reward, done, and additional info
+            return observation, self.score, not self.running, False, {}
+
+        timer.lap("observation")
+        info = {"timing_ns": timer.end("step")}
+        if not self.running:
+            timer.dump()
+        return observation, self.score, not self.running, False, info
+
+    def timing_summary(self):
+        # p50 / p95 / p99 per phase so far, None without step_timing; env_method("timing_summary")
+        # reads it from every worker of a VecEnv
+        return None if self.step_timer is None else self.step_timer.summary()
+
+    def band_reward(self, angle1_change, angle2_change):
+        # Calculate distance to apple and store it as an attribute
+        end_x2, end_y2 = self.robot_arm.end_effector()
 
-        # Return observation, reward, done, and additional info
-        return self._get_observation(), self.score, not self.running, False, {}
+        self.distance_to_apple = math.hypot(self.apple_pos[0] - end_x2, self.apple_pos[1] - end_y2)
 
+        self.distance_to_box = math.hypot(self.box_pos[0] - end_x2, self.box_pos[1] - end_y2)
 
-    def render(self, mode="human"):
+        # Update robot arm angles based on action
+        self.update(angle1_change, angle2_change)
+        if self.step_timer is not None:
+            self.step_timer.lap("kinematics")
+
+        # Reward logic: the first band of rewards.REWARD_BANDS the arm falls in
+        self.take_band(self.reward_bands.match(self.distance_to_apple, self.distance_to_box, self.state))
+
+    def lookup_reward(self, angle1_change, angle2_change):
+        # Same outcome as band_reward, distances and band read from tables for the current apple and box
+        table = self.reward_table
+        arm = self.robot_arm
+        if not (table.covers(arm.angle1) and table.covers(arm.angle2)):
+            return self.band_reward(angle1_change, angle2_change)
+        table.set_goals(self.apple_pos, self.box_pos)
+        band_rows, apple_rows, box_rows = table.rows
+        index1, index2 = table.index(arm.angle1), table.index(arm.angle2)
+        self.distance_to_apple = apple_rows[index1][index2]
+        self.distance_to_box = box_rows[index1][index2]
+
+        self.update(angle1_change, angle2_change)
+        if self.step_timer is not None:
+            self.step_timer.lap("kinematics")
+
+        self.take_band(band_rows[table.state_index(self.state)][index1][index2])
+
+    def take_band(self, band):
+        # The pick / place a matched band tries, the new score and the state it leads to
+        bands = self.reward_bands
+        kind = bands.kind(band)
+        success = False
+        if kind == rewards.PICK:  # Gripper passes over the apple
+            success = self.robot_arm.pick(self.apple_pos, self.object_radius)
+        elif kind == rewards.PLACE:
+            success = self.robot_arm.place(self.box_pos, self.object_radius)
+        score = bands.apply(band, self.score, self.distance_to_apple, self.distance_to_box, bool(success))
+
+        if success and kind == rewards.PICK:
+            self.score = score  # Reward for passing over the target
+            tracing.event("apple_picked", score=self.score)
+            self.state[0] = 1  # Indicating the apple has been picked
+            self.state[1] = 0  # Indicating the apple has been placed
+            self.apple_pos = self.generate_apple_position()  # Generate a new apple position
+        elif success:
+            tracing.event("apple_placed", score=self.score)
+            self.score = score
+            self.state[0] = 1  # Indicating the apple has been picked
+            self.state[1] = 1  # Indicating the apple has been placed
+            self.apple_pos = self.generate_apple_position()
+        else:
+            self.score = score
+
+    def render(self, mode=None):
+        mode = mode or self.render_mode
         if mode == "human":
-            pygame.display.flip()
+            if self.render_mode == "human":
+                pygame.display.flip()
         elif mode == "rgb_array":
             self.draw()
-            observation = self._get_observation()
-            return observation
+            return pygame.surfarray.array3d(self.screen).transpose(1, 0, 2)
         else:
             raise NotImplementedError("Only human and rgb_array rendering modes are supported.")
 
 
 
     def close(self):
+        self.hud = None  # Its font dies with pygame
         pygame.quit()
 
-class RobotArm:
-    def __init__(self, base_x, base_y, arm_length, screen, BLACK, RED, GREEN, BLUE):
-        self.base_x = base_x
-        self.base_y = base_y
-        self.arm_length = arm_length
-        self.angle1 = 0
-        self.angle2 = 0
-        self.holding = None
-        self.screen = screen  # Store the screen object
-        self.BLACK = BLACK
-        self.RED = RED
-        self.GREEN = GREEN
-        self.BLUE = BLUE
-
-    def update(self, angle1_change, angle2_change):
-        self.angle1 += angle1_change
-        self.angle2 += angle2_change
-
-    def draw(self):  # Remove screen argument
-        end_x1 = self.base_x + self.arm_length * math.cos(math.radians(self.angle1))
-        end_y1 = self.base_y - self.arm_length * math.sin(math.radians(self.angle1))
-        end_x2 = end_x1 + self.arm_length * math.cos(math.radians(self.angle2))
-        end_y2 = end_y1 - self.arm_length * math.sin(math.radians(self.angle2))
-        pygame.draw.line(self.screen, self.BLACK, (self.base_x, self.base_y), (end_x1, end_y1), 5)
-        pygame.draw.line(self.screen, self.BLACK, (end_x1, end_y1), (end_x2, end_y2), 5)
-        pygame.draw.circle(self.screen, self.RED, (int(end_x2), int(end_y2)), 10)
-        if self.holding:
-            pygame.draw.circle(self.screen, self.GREEN, (int(end_x2), int(end_y2)), 15)
-
-    def pick(self, object_pos, object_radius):
-        end_x2 = self.base_x + self.arm_length * math.cos(math.radians(self.angle1)) + \
-                 self.arm_length * math.cos(math.radians(self.angle2))
-        end_y2 = self.base_y - self.arm_length * math.sin(math.radians(self.angle1)) - \
-                 self.arm_length * math.sin(math.radians(self.angle2))
-        distance = math.sqrt((object_pos[0] - end_x2) ** 2 + (object_pos[1] - end_y2) ** 2)
-        if distance < object_radius:
-            self.holding = object_pos
-            return True
-        else:
-            return False
-
-    def place(self, target_pos, target_radius):
-        if self.holding:
-            end_x2 = self.base_x + self.arm_length * math.cos(math.radians(self.angle1)) + \
-                     self.arm_length * math.cos(math.radians(self.angle2))
-            end_y2 = self.base_y - self.arm_length * math.sin(math.radians(self.angle1)) - \
-                     self.arm_length * math.sin(math.radians(self.angle2))
-            distance = math.sqrt((target_pos[0] - end_x2) ** 2 + (target_pos[1] - end_y2) ** 2)
-            if distance < target_radius:
-                self.holding = None
-                return True
-        return False
-
 # For testing the environment
 # if __name__ == "__main__":
 #     pygame.init()
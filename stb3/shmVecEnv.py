@@ -0,0 +1,179 @@
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper, VecEnv
+from stable_baselines3.common.vec_env.patch_gym import _patch_env
+
+
+def _worker(remote, parent_remote, env_fn_wrapper, env_idx):
+    from stable_baselines3.common.env_util import is_wrapped
+
+    parent_remote.close()
+    env = _patch_env(env_fn_wrapper.var())
+    remote.send((env.observation_space, env.action_space))
+
+    # Attach to the learner's observation block, this worker owns column env_idx of both slots
+    shm_name, shape, dtype = remote.recv()
+    shm = SharedMemory(name=shm_name)
+    slots = np.ndarray(shape, dtype=dtype, buffer=shm.buf)[:, env_idx]
+
+    reset_info = {}
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                action, slot = data
+                observation, reward, terminated, truncated, info = env.step(action)
+                done = terminated or truncated
+                info["TimeLimit.truncated"] = truncated and not terminated
+                if done:
+                    # The terminal frame goes over the pipe, but only once per episode
+                    info["terminal_observation"] = np.array(observation)
+                    observation, reset_info = env.reset()
+                np.copyto(slots[slot], observation)
+                remote.send((reward, done, info, reset_info))
+            elif cmd == "reset":
+                seed, options, slot = data
+                maybe_options = {"options": options} if options else {}
+                observation, reset_info = env.reset(seed=seed, **maybe_options)
+                np.copyto(slots[slot], observation)
+                remote.send(reset_info)
+            elif cmd == "render":
+                remote.send(env.render())
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            elif cmd == "env_method":
+                method = env.get_wrapper_attr(data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "get_attr":
+                remote.send(env.get_wrapper_attr(data))
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "is_wrapped":
+                remote.send(is_wrapped(env, data))
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del slots
+        shm.close()
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """SubprocVecEnv whose observations travel through shared memory instead of pipes.
+
+    Workers copy each observation (e.g. robotEnv.CustomEnv._get_observation) into their
+    row of a preallocated multiprocessing.shared_memory block; only actions, rewards,
+    dones and infos are pickled. step() and reset() return a view of that block. There
+    are two slots used in turn, so a returned batch stays valid until the step after
+    next, which covers SB3 keeping the previous observation while it steps again.
+    """
+
+    def __init__(self, env_fns, start_method=None):
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for env_idx, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes, self.remotes, env_fns)):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), env_idx)
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        observation_space, action_space = self.remotes[0].recv()
+        for remote in self.remotes[1:]:
+            remote.recv()
+        if not isinstance(observation_space, spaces.Box):
+            raise ValueError("SharedMemoryVecEnv only supports Box observation spaces.")
+
+        # (slot, env, *obs_shape)
+        shape = (2, n_envs) + observation_space.shape
+        dtype = observation_space.dtype
+        self._shm = SharedMemory(create=True, size=int(np.prod(shape)) * dtype.itemsize)
+        self._obs = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf)
+        self._slot = 0
+        for remote in self.remotes:
+            remote.send((self._shm.name, shape, dtype))
+
+        super().__init__(n_envs, observation_space, action_space)
+
+    def step_async(self, actions):
+        self._slot ^= 1
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", (action, self._slot)))
+        self.waiting = True
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        rewards, dones, infos, self.reset_infos = zip(*results)
+        return self._obs[self._slot], np.stack(rewards), np.stack(dones), infos
+
+    def reset(self):
+        self._slot ^= 1
+        for env_idx, remote in enumerate(self.remotes):
+            remote.send(("reset", (self._seeds[env_idx], self._options[env_idx], self._slot)))
+        self.reset_infos = [remote.recv() for remote in self.remotes]
+        # Seeds and options are only used once
+        self._reset_seeds()
+        self._reset_options()
+        return self._obs[self._slot]
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        del self._obs
+        self._shm.close()
+        self._shm.unlink()
+        self.closed = True
+
+    def get_images(self):
+        for remote in self.remotes:
+            remote.send(("render", None))
+        return [remote.recv() for remote in self.remotes]
+
+    def get_attr(self, attr_name, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("get_attr", attr_name))
+        return [remote.recv() for remote in target_remotes]
+
+    def set_attr(self, attr_name, value, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("set_attr", (attr_name, value)))
+        for remote in target_remotes:
+            remote.recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("env_method", (method_name, method_args, method_kwargs)))
+        return [remote.recv() for remote in target_remotes]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("is_wrapped", wrapper_class))
+        return [remote.recv() for remote in target_remotes]
+
+    def _get_target_remotes(self, indices):
+        return [self.remotes[i] for i in self._get_indices(indices)]
@@ -0,0 +1,25 @@
+import pygame
+
+
+class SimClock:
+    """Step-counting clock, every tick advances simulated time by 1 / fps seconds."""
+
+    def __init__(self, fps, realtime=False):
+        self.fps = fps
+        self.steps = 0
+        # Only a human-facing env is paced against the wall clock
+        self._clock = pygame.time.Clock() if realtime else None
+
+    def tick(self):
+        self.steps += 1
+        if self._clock is not None:
+            self._clock.tick(self.fps)
+
+    @property
+    def time(self):
+        # Simulated seconds since reset
+        return self.steps / self.fps
+
+    def elapsed(self, start_step):
+        # Simulated seconds since the tick count was start_step
+        return (self.steps - start_step) / self.fps
@@ -0,0 +1,159 @@
+import json
+import os
+import time
+
+# Histogram buckets: exact below 2 ** SUB_BITS ns, above that each power of two is split into
+# 2 ** SUB_BITS buckets, so a bucket is at most 1 / 16 of its values wide
+SUB_BITS = 4
+SUB = 1 << SUB_BITS
+N_BUCKETS = 64 * SUB
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def bucket_index(value):
+    if value < SUB:
+        return max(value, 0)
+    shift = value.bit_length() - SUB_BITS - 1
+    return (shift + 1) * SUB + (value >> shift) - SUB
+
+
+def bucket_bounds(index):
+    # [low, high) of the values counted in a bucket
+    if index < SUB:
+        return index, index + 1
+    shift = index // SUB - 1
+    mantissa = index % SUB + SUB
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class StreamingHistogram:
+    """Log-bucketed histogram of integer durations in nanoseconds, fixed size however many
+    values it has seen. Quantiles are read from the buckets, within a bucket's width."""
+
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen > rank:
+                low, high = bucket_bounds(index)
+                # Bucket midpoint, kept inside the range actually seen
+                return min(max((low + high - 1) / 2, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        summary = {"count": self.count, "mean_ns": self.total / self.count if self.count else None,
+                   "min_ns": self.min, "max_ns": self.max}
+        for q in QUANTILES:
+            summary[f"p{round(q * 100)}_ns"] = self.quantile(q)
+        return summary
+
+    def to_dict(self):
+        # Sparse buckets, enough to rebuild the histogram with from_dict
+        return {"buckets": {index: count for index, count in enumerate(self.counts) if count},
+                "count": self.count, "total": self.total, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for index, count in data["buckets"].items():
+            histogram.counts[int(index)] = count
+        histogram.count, histogram.total = data["count"], data["total"]
+        histogram.min, histogram.max = data["min"], data["max"]
+        return histogram
+
+
+class StepTimer:
+    """Per-phase perf_counter_ns timings of one env's step() and reset().
+
+    begin() starts a step, lap(name) closes the phase running since the previous mark and
+    end() returns the step's {phase: ns} with its total. Every phase also feeds a streaming
+    histogram, read with summary() at any time. With dump_dir set, dump() writes the
+    histograms of this worker to <dump_dir>/stepTiming-<pid>-<id>.json, replacing the last dump.
+    """
+
+    def __init__(self, dump_dir=None):
+        self.histograms = {}
+        self.current = {}
+        self.dump_dir = dump_dir
+        self._start = 0
+        self._last = 0
+
+    def begin(self):
+        self.current = {}
+        self._start = self._last = time.perf_counter_ns()
+
+    def lap(self, name):
+        now = time.perf_counter_ns()
+        elapsed = now - self._last
+        self._last = now
+        self.current[name] = elapsed
+        self._add(name, elapsed)
+
+    def end(self, name="step"):
+        # The finished step's timings, the total recorded under name
+        total = self._last - self._start
+        self.current[name] = total
+        self._add(name, total)
+        return self.current
+
+    def _add(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = StreamingHistogram()
+        histogram.add(value)
+
+    def summary(self):
+        return {name: histogram.summary() for name, histogram in self.histograms.items()}
+
+    def dump(self, path=None):
+        if path is None:
+            if self.dump_dir is None:
+                return None
+            os.makedirs(self.dump_dir, exist_ok=True)
+            path = os.path.join(self.dump_dir, f"stepTiming-{os.getpid()}-{id(self):x}.json")
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(),
+                       "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()}},
+                      f, indent=2)
+        return path
+
+
+def merge_summaries(dumps):
+    # One summary over several workers' dump() files or dicts, e.g. all envs of a VecEnv
+    histograms = {}
+    for dump in dumps:
+        if isinstance(dump, str):
+            with open(dump) as f:
+                dump = json.load(f)
+        for name, data in dump["histograms"].items():
+            histograms.setdefault(name, StreamingHistogram()).merge(StreamingHistogram.from_dict(data))
+    return {name: histogram.summary() for name, histogram in histograms.items()}
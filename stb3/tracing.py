@@ -0,0 +1,232 @@
+import glob
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import gymnasium as gym
+
+# Set by enable(), so env workers started afterwards trace into the same directory
+TRACE_DIR_VAR = "ROBOT_TRACE_DIR"
+DEFAULT_CAPACITY = 1 << 20
+
+logger = logging.getLogger("robotEnv.events")
+
+
+class Tracer:
+    """Spans and instant events of one process, kept in a fixed-size ring buffer.
+
+    Writers take the next sequence number from an itertools.count, which is atomic under
+    the GIL, and store into their own slot, so env code, the learner and any other thread
+    record without a lock. Once capacity events were written the oldest are overwritten.
+    Times are perf_counter_ns, the same monotonic clock in every process on a host.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, process_name=None):
+        self.capacity = capacity
+        self.process_name = process_name
+        self._events = [None] * capacity
+        self._sequence = itertools.count()
+
+    def _record(self, phase, name, category, start, duration, args):
+        sequence = next(self._sequence)
+        self._events[sequence % self.capacity] = (sequence, phase, name, category, start, duration,
+                                                  threading.get_ident(), args)
+
+    def complete(self, name, category, start, end=None, args=None):
+        # A span from start to end (now by default), both perf_counter_ns
+        if end is None:
+            end = time.perf_counter_ns()
+        self._record("X", name, category, start, end - start, args)
+
+    def instant(self, name, category, args=None):
+        self._record("i", name, category, time.perf_counter_ns(), 0, args)
+
+    def span(self, name, category="", **args):
+        return Span(self, name, category, args or None)
+
+    def events(self):
+        # The events still held, oldest first
+        written = next(self._sequence)  # Skips one number, harmless
+        oldest = written - self.capacity
+        events = [event for event in self._events if event is not None and event[0] > oldest]
+        return sorted(events)
+
+    def clear(self):
+        self._events = [None] * self.capacity
+
+    def chrome_events(self):
+        # Chrome trace / Perfetto "traceEvents", timestamps in microseconds
+        pid = os.getpid()
+        threads = {}
+        out = [{"ph": "M", "name": "process_name", "pid": pid, "tid": 0,
+                "args": {"name": f"{self.process_name or 'process'} {pid}"}}]
+        for _, phase, name, category, start, duration, thread, args in self.events():
+            tid = threads.setdefault(thread, len(threads))
+            event = {"ph": phase, "name": name, "cat": category, "ts": start / 1000, "pid": pid, "tid": tid}
+            if phase == "X":
+                event["dur"] = duration / 1000
+            else:
+                event["s"] = "t"
+            if args:
+                event["args"] = args
+            out.append(event)
+        return out
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.chrome_events(), "displayTimeUnit": "ms"}, f, default=float)
+        return path
+
+
+class Span:
+    __slots__ = ("tracer", "name", "category", "args", "start")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer, self.name, self.category, self.args = tracer, name, category, args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.complete(self.name, self.category, self.start, args=self.args)
+        return False
+
+
+class _NullSpan:
+    # What span() hands out while tracing is off
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+_tracer = None
+_trace_dir = None
+
+
+def enable(trace_dir, capacity=DEFAULT_CAPACITY, process_name="learner"):
+    """Start tracing this process into trace_dir; env workers started later trace there too."""
+    global _tracer, _trace_dir
+    os.makedirs(trace_dir, exist_ok=True)
+    os.environ[TRACE_DIR_VAR] = trace_dir
+    _trace_dir = trace_dir
+    _tracer = Tracer(capacity, process_name)
+    return _tracer
+
+
+def tracer():
+    # The process tracer, None while tracing is off
+    return _tracer
+
+
+def span(name, category="", **args):
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, category, **args)
+
+
+def flush():
+    # Writes this process's events to <trace dir>/trace-<pid>.json, for merge()
+    if _tracer is None:
+        return None
+    return _tracer.export(os.path.join(_trace_dir, f"trace-{os.getpid()}.json"))
+
+
+def merge(trace_dir, path=None):
+    """Joins every process's flush() in trace_dir into one trace, open it in
+    chrome://tracing or ui.perfetto.dev."""
+    events = []
+    for part in sorted(glob.glob(os.path.join(trace_dir, "trace-*.json"))):
+        with open(part) as f:
+            events.extend(json.load(f)["traceEvents"])
+    path = path or os.path.join(trace_dir, "trace.json")
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return path
+
+
+class EventLimiter:
+    """Token bucket per event name: bursts of up to burst events, then rate per second.
+    Dropped events are counted and reported with the next one that goes through."""
+
+    def __init__(self, rate=1.0, burst=10):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+
+    def allow(self, name):
+        # (allowed, events dropped since the last allowed one)
+        now = time.monotonic()
+        tokens, last, dropped = self._buckets.get(name, (self.burst, now, 0))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self._buckets[name] = (tokens, now, dropped + 1)
+            return False, dropped + 1
+        self._buckets[name] = (tokens - 1, now, 0)
+        return True, dropped
+
+
+limiter = EventLimiter()
+
+
+def _default_handler():
+    # Env workers started with spawn or forkserver never see the learner's logging setup, so
+    # without any handler in the process events go to stderr as the learner prints them. Not
+    # propagated, so a root handler configured later does not print them twice
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def event(name, **fields):
+    """A structured env event, logged at INFO on the robotEnv.events logger and recorded as
+    an instant event when tracing; rate limited per name by limiter."""
+    allowed, dropped = limiter.allow(name)
+    if not allowed:
+        return
+    if dropped:
+        fields["dropped"] = dropped
+    if not logger.hasHandlers():
+        _default_handler()
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s %s", name, json.dumps(fields, default=float))
+    if _tracer is not None:
+        _tracer.instant(name, "event", fields)
+
+
+class TracedEnv(gym.Wrapper):
+    """Records a span for every step and reset of the wrapped env, and flushes this
+    process's trace when the env is closed, which is how env workers hand theirs over."""
+
+    def step(self, action):
+        with span("env.step", "env"):
+            return self.env.step(action)
+
+    def reset(self, **kwargs):
+        with span("env.reset", "env"):
+            return self.env.reset(**kwargs)
+
+    def close(self):
+        super().close()
+        flush()
+
+
+def _after_fork():
+    # A forked worker starts its own trace rather than re-exporting the parent's events
+    global _tracer
+    if _tracer is not None:
+        _tracer = Tracer(_tracer.capacity, "env worker")
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+# Workers started with spawn or forkserver pick tracing up from the environment
+if os.environ.get(TRACE_DIR_VAR):
+    enable(os.environ[TRACE_DIR_VAR], process_name="env worker")
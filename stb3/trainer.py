@@ -1,37 +1,166 @@
+import argparse
+import json
 import gymnasium as gym
+import numpy as np
 from stable_baselines3 import A2C
 from stable_baselines3 import PPO, DQN, TD3, DDPG, SAC
 from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+import logging
 import os
 import time
 from customENV import CustomEnv
-import pygame
+from robotEnv import CustomEnv as RobotEnv
+from shmVecEnv import SharedMemoryVecEnv
+from compactFeatures import CompactFrameExtractor
+from callbacks import TraceCallback, ProfilerCallback, CheckpointCallback, RenderSnapshotCallback
+import tracing
 
 import matplotlib.pyplot as plt
 
-model_dir = f"report/PPO_Robot2DoF/model"
-logdir = f"report/PPO_Robot2DoF/logs"
-if not os.path.exists(model_dir):
-    os.makedirs(model_dir)
-if not os.path.exists(logdir):
-    os.makedirs(logdir)
 
-screen = pygame.display.set_mode((800, 600))
-# Create and wrap your custom environment
-env = CustomEnv(screen)  # Replace 'screen' with your screen object if needed
-env = Monitor(env, logdir)  # Wrap with Monitor for logging
-# env.reset()
+ALGOS = {"A2C": A2C, "PPO": PPO, "DQN": DQN}
 
-# Initialize and train the PPO model
-model = PPO("MlpPolicy", env, verbose=1, tensorboard_log=logdir, batch_size=4)
+# Training settings, overridden by a --config JSON file and then by command line flags.
+# algo_kwargs go to the algorithm's constructor as they are (config file only).
+DEFAULTS = {
+    "algo": "PPO",
+    "policy": "MlpPolicy",
+    "timesteps": 10_000,
+    "batch_size": 64,
+    "checkpoint_every": 1000,
+    "snapshot_every": 0,
+    "algo_kwargs": {},
+}
 
-TIMESTEPS = 100
-for i in range(1, 100):
-    model.learn(total_timesteps=TIMESTEPS, reset_num_timesteps=False, tb_log_name="PPO")
-    model.save(f"{model_dir}/{TIMESTEPS*i}")
+# Constructor defaults per algorithm, under algo_kwargs. SB3's DQN keeps a million transitions,
+# two full 800x600 frames each on the pixel env, so the replay buffer is kept small
+ALGO_DEFAULTS = {"DQN": {"buffer_size": 1000, "learning_starts": 500}}
+# Largest replay buffer (observations and next observations) DQN is allowed to allocate
+REPLAY_LIMIT_BYTES = 8 << 30
 
-    # Render the environment in rgb_array mode after training
-    obs = env.render()
 
-# Close the environment
-env.close()
\ No newline at end of file
+def load_config(args):
+    config = dict(DEFAULTS)
+    if args.config is not None:
+        with open(args.config) as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown settings in {args.config}: {', '.join(sorted(unknown))}")
+        config.update(overrides)
+    for name in DEFAULTS:
+        value = getattr(args, name, None)
+        if value is not None:
+            config[name] = value
+    if config["algo"] not in ALGOS:
+        raise ValueError(f"algo must be one of {', '.join(ALGOS)}, got {config['algo']}")
+    return config
+
+
+def make_env(rank, logdir, env_name="customENV", compact=False, trace=False):
+    # Each worker gets a headless env and its own Monitor log, logs/<rank>.monitor.csv. env_name is
+    # the module the env comes from, customENV or robotEnv, which reward the arm differently
+    def _init():
+        if env_name == "customENV":
+            env = CustomEnv(render_mode="rgb_array")
+        elif compact:
+            env = RobotEnv(render_mode="rgb_array", obs_mode="compact")
+        else:
+            env = RobotEnv(render_mode="rgb_array")
+        if trace:
+            env = tracing.TracedEnv(env)
+        return Monitor(env, os.path.join(logdir, str(rank)))
+    return _init
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train an SB3 agent on the 2DoF robot arm env.")
+    parser.add_argument("--config", default=None,
+                        help="JSON file with any of " + ", ".join(DEFAULTS) + "; command line flags override it")
+    parser.add_argument("--algo", choices=list(ALGOS), default=None, help=f"Default {DEFAULTS['algo']}")
+    parser.add_argument("--policy", default=None, help=f"Default {DEFAULTS['policy']}")
+    parser.add_argument("--timesteps", type=int, default=None, help=f"Env steps in total, default {DEFAULTS['timesteps']}")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help=f"Minibatch size for PPO and DQN, default {DEFAULTS['batch_size']}")
+    parser.add_argument("--checkpoint-every", type=int, default=None,
+                        help=f"Env steps between checkpoints, default {DEFAULTS['checkpoint_every']}")
+    parser.add_argument("--snapshot-every", type=int, default=None,
+                        help="Env steps between rendered PNG snapshots, 0 for none (the default)")
+    parser.add_argument("--n-envs", type=int, default=1, help="Env workers, one process each when more than one")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed, worker i is seeded with seed + i")
+    parser.add_argument("--env", choices=["customENV", "robotEnv"], default="customENV",
+                        help="Env module to train on, the two reward the arm differently; --render-on-sample needs robotEnv")
+    parser.add_argument("--shm", action="store_true", help="Return worker frames through shared memory, not pipes")
+    parser.add_argument("--render-on-sample", action="store_true",
+                        help="Roll out compact-state envs and draw 84x84 frames only inside the policy's feature extractor")
+    parser.add_argument("--trace", default=None, metavar="DIR",
+                        help="Record env steps, rollouts, updates and saves, merged into DIR/trace.json")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time rollouts against updates, written to report/<algo>_Robot2DoF/logs/profile")
+    parser.add_argument("--profile-torch", type=int, nargs="*", default=[], metavar="UPDATE",
+                        help="With --profile, updates (counted from 0) to capture with torch.profiler")
+    args = parser.parse_args()
+    if args.render_on_sample and args.env != "robotEnv":
+        parser.error(f"--render-on-sample steps compact robotEnv envs, a different task from {args.env}; "
+                     "pass --env robotEnv")
+    config = load_config(args)
+
+    # Env events (pick, place, game over) are logged, rate limited, instead of printed
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.trace:
+        tracing.enable(args.trace)
+
+    algo = config["algo"]
+    model_dir = f"report/{algo}_Robot2DoF/model"
+    logdir = f"report/{algo}_Robot2DoF/logs"
+    if not os.path.exists(model_dir):
+        os.makedirs(model_dir)
+    if not os.path.exists(logdir):
+        os.makedirs(logdir)
+
+    # Create the env workers, rendered offscreen so no window is opened
+    env_fns = [make_env(rank, logdir, args.env, args.render_on_sample, args.trace is not None) for rank in range(args.n_envs)]
+    if args.n_envs == 1:
+        env = DummyVecEnv(env_fns)
+    elif args.shm:
+        env = SharedMemoryVecEnv(env_fns)
+    else:
+        env = SubprocVecEnv(env_fns)
+    env.seed(args.seed)
+
+    # Initialize the model
+    algo_kwargs = {**ALGO_DEFAULTS.get(algo, {}), **config["algo_kwargs"]}
+    if "buffer_size" in algo_kwargs:
+        # Checked before SB3 tries to allocate it
+        observation_bytes = int(np.prod(env.observation_space.shape)) * env.observation_space.dtype.itemsize
+        replay_bytes = 2 * observation_bytes * algo_kwargs["buffer_size"]
+        if replay_bytes > REPLAY_LIMIT_BYTES:
+            raise ValueError(f"A {algo} replay buffer of {algo_kwargs['buffer_size']} transitions needs "
+                             f"{replay_bytes / (1 << 30):.1f} GiB for these observations, over "
+                             f"{REPLAY_LIMIT_BYTES >> 30} GiB; lower algo_kwargs.buffer_size or use --render-on-sample")
+    if algo != "A2C":  # A2C updates on the whole rollout, it has no minibatches
+        algo_kwargs.setdefault("batch_size", config["batch_size"])
+    if args.render_on_sample:
+        algo_kwargs["policy_kwargs"] = dict(features_extractor_class=CompactFrameExtractor)
+    model = ALGOS[algo](config["policy"], env, verbose=1, tensorboard_log=logdir, seed=args.seed, **algo_kwargs)
+
+    # Callback frequencies count calls to the vec env's step, each steps every worker
+    callbacks = [TraceCallback(),
+                 CheckpointCallback(max(config["checkpoint_every"] // args.n_envs, 1), model_dir, name_prefix=algo)]
+    if config["snapshot_every"]:
+        callbacks.append(RenderSnapshotCallback(max(config["snapshot_every"] // args.n_envs, 1),
+                                                os.path.join(logdir, "snapshots")))
+    if args.profile:
+        callbacks.append(ProfilerCallback(os.path.join(logdir, "profile"), args.profile_torch, verbose=1))
+
+    # One learn() call for the whole run, checkpoints are saved by the callback
+    model.learn(total_timesteps=config["timesteps"], tb_log_name=algo, callback=callbacks)
+    with tracing.span("model.save", "learner"):
+        model.save(f"{model_dir}/{model.num_timesteps}")
+
+    # Close the environment, workers flush their traces as they close
+    env.close()
+    if args.trace:
+        tracing.flush()
+        print(f"Trace written to {tracing.merge(args.trace)}")